@@ -66,15 +66,25 @@ except Exception as e:
 from kivy.lang import Builder
 from utils.arabic_utils import ar
 
-# Import screens
-# ...
-from screens.splash import SplashScreen
-from screens.login import LoginScreen
-from screens.register import RegisterScreen
-from screens.home import HomeScreen
-from screens.admin import AdminScreen
-from screens.features import FeaturesScreen
-from screens.settings import SettingsScreen
+# Screens are imported and built on first navigation (see LazyScreenManager)
+from screens.lazy_manager import LazyScreenManager
+
+SCREENS = [
+    ('splash', 'screens.splash', 'SplashScreen'),
+    ('login', 'screens.login', 'LoginScreen'),
+    ('register', 'screens.register', 'RegisterScreen'),
+    ('home', 'screens.home', 'HomeScreen'),
+    ('admin', 'screens.admin', 'AdminScreen'),
+    ('features', 'screens.features', 'FeaturesScreen'),
+    ('settings', 'screens.settings', 'SettingsScreen'),
+]
+# الشاشة المتوقعة بعد كل شاشة: تُبنى في وقت الفراغ حتى يكون الانتقال إليها فورياً
+LIKELY_NEXT = {
+    'splash': ('home', 'login'),
+    'home': ('login',),
+    'login': ('home', 'register'),
+    'register': ('login',),
+}
 
 # Load styles
 try:
@@ -135,29 +145,40 @@ class MainApp(App):
         # Set window background color
         Window.clearcolor = self.get_background_color()
         
+        # ─── النسخة المحلية أولاً: واجهة جاهزة ودخول بدون انتظار الشبكة ───
+        from utils.firebase_manager import FirebaseManager
+        FirebaseManager.load_snapshot()
+
         # Create screen manager with fade transition
-        self.sm = ScreenManager(transition=FadeTransition(duration=0.3))
+        self.sm = LazyScreenManager(transition=FadeTransition(duration=0.3))
         
-        # Add screens
-        self.sm.add_widget(SplashScreen(name='splash'))
-        self.sm.add_widget(LoginScreen(name='login'))
-        self.sm.add_widget(RegisterScreen(name='register'))
-        self.sm.add_widget(HomeScreen(name='home'))
-        self.sm.add_widget(AdminScreen(name='admin'))
-        self.sm.add_widget(FeaturesScreen(name='features'))
-        self.sm.add_widget(SettingsScreen(name='settings'))
+        # Register screens; only the splash screen is built before the first frame
+        for name, module, class_name in SCREENS:
+            self.sm.register(name, module, class_name)
+        self.sm.current = 'splash'
         
-        # ─── المزامنة السحابية عند البدء ───
-        from utils.firebase_manager import FirebaseManager
-        FirebaseManager.sync_data()
+        # ─── المزامنة السحابية في الخلفية (تحدّث النسخة المحلية) ───
+        # النطاق يتبع الدور: الزائر والطالب يحملان بياناتهما فقط، والأدمن كل القاعدة
+        FirebaseManager.set_sync_scope(self.user_role, self.user_code)
+        FirebaseManager.start_realtime_sync()
+        scope_trigger = Clock.create_trigger(lambda dt: FirebaseManager.set_sync_scope(self.user_role, self.user_code))
+        self.bind(user_role=lambda *a: scope_trigger(), user_code=lambda *a: scope_trigger())
         
         # Bind to screen changes for animations
         self.sm.bind(current=self.on_screen_change)
+        self.on_screen_change(self.sm, self.sm.current)
         
         return self.sm
     
+    def on_stop(self):
+        from utils.firebase_manager import FirebaseManager
+        FirebaseManager.flush_writes()
+        FirebaseManager.stop_realtime_sync()
+        FirebaseManager.save_snapshot()
+
     def on_screen_change(self, instance, screen_name):
         """Handle screen change animations"""
+        self.sm.prebuild(*LIKELY_NEXT.get(screen_name, ()))
         if screen_name in ['home', 'features', 'settings', 'admin']:
             # Trigger screen animations when it becomes current
             screen = self.sm.get_screen(screen_name)
@@ -215,4 +236,6 @@ class MainApp(App):
             pass
 
 if __name__ == '__main__':
-    MainApp().run()
+    # تشغيل Kivy داخل حلقة asyncio حتى تعمل واجهة AsyncFirebaseManager (await) مع الشاشات
+    import asyncio
+    asyncio.run(MainApp().async_run(async_lib='asyncio'))
@@ -5,13 +5,20 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
+from kivy.uix.checkbox import CheckBox
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.uix.popup import Popup
 from kivy.graphics import Color, RoundedRectangle
 from kivy.metrics import dp
-from kivy.utils import get_color_from_hex
+from kivy.utils import get_color_from_hex, platform
 from kivy.app import App
 from utils.firebase_manager import FirebaseManager
+from utils.firebase_async import AsyncFirebaseManager, run_async
 from utils.arabic_utils import ar
+from utils.tab_cache import TabCache
+from utils.widget_pool import WidgetPool
 import time
 
 # الألوان
@@ -58,11 +65,147 @@ class TabBar(BoxLayout):
             b.color = get_color_from_hex(C_BLUE if i == idx else C_SUB)
             b.bold = (i == idx)
 
+# --- صفوف قائمة الطلاب: تُنشأ بعدد الظاهر فقط ثم تُربط بها بيانات العنصر عند التمرير ---
+class AdminListRow(RecycleDataViewBehavior, BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.owner, self.item = None, None
+        self.build()
+
+    def build(self): pass
+    def bind_item(self, item): pass
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.owner, self.item = data.get('owner'), data
+        self.bind_item(data)
+
+    def _call(self, name, *args):
+        if self.owner is not None: getattr(self.owner, name)(*args)
+
+
+class SectionLabel(AdminListRow):
+    def build(self):
+        self.lbl = Label(font_name=App.get_running_app().font_name, color=get_color_from_hex(C_SUB), halign='right')
+        self.add_widget(self.lbl)
+
+    def bind_item(self, item): self.lbl.text = ar(item['text'])
+
+
+class PendingHeader(AdminListRow):
+    def build(self):
+        self.orientation, self.spacing = 'vertical', dp(6)
+        self.add_widget(Label(text=ar('⚠️ طلبات بانتظار الموافقة'), font_name=App.get_running_app().font_name, color=get_color_from_hex(C_YELLOW), size_hint_y=None, height=dp(30), halign='right'))
+        bulk_bar = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(6))
+        bulk_bar.add_widget(action_btn('قبول المحدد', C_GREEN, lambda x: self._call('_bulk_resolve', True, True), dp(40), dp(11)))
+        bulk_bar.add_widget(action_btn('رفض المحدد', C_RED, lambda x: self._call('_bulk_resolve', False, True), dp(40), dp(11)))
+        bulk_bar.add_widget(action_btn('قبول الكل', C_GREEN, lambda x: self._call('_bulk_resolve', True), dp(40), dp(11)))
+        bulk_bar.add_widget(action_btn('رفض الكل', C_RED, lambda x: self._call('_bulk_resolve', False), dp(40), dp(11)))
+        self.add_widget(bulk_bar)
+
+
+class StudentsBar(AdminListRow):
+    def build(self):
+        self.spacing = dp(10)
+        self.add_widget(action_btn('إضافة طالب جديد', C_GREEN, lambda x: self._call('show_add_student_dialog'), dp(40)))
+        self.add_widget(action_btn('استيراد من ملف CSV', C_BLUE, lambda x: self._call('show_import_students_dialog'), dp(40)))
+
+
+class RequestRow(AdminListRow):
+    """ صف طلب معلق مع مربع اختيار للإجراءات الجماعية """
+    def build(self):
+        self.padding, self.spacing = [dp(10), 0], dp(8)
+        make_card_bg(self, '#1c2744')
+        self.check = CheckBox(size_hint_x=None, width=dp(30))
+        self.check.bind(active=lambda inst, on: self.item and self._call('_set_selected', self.item['key'], on))
+        self.lbl = Label(font_name=App.get_running_app().font_name, halign='right', size_hint_x=0.5)
+        self.add_widget(self.check); self.add_widget(self.lbl)
+
+    def bind_item(self, item):
+        self.check.active = item['key'] in self.owner._selected
+
+
+class PendingRow(RequestRow):
+    def build(self):
+        super().build()
+        self.add_widget(action_btn('قبول', C_GREEN, lambda x: self._call('_approve_reg', self.item['code']), dp(36)))
+        self.add_widget(action_btn('رفض', C_RED, lambda x: self._call('_reject_reg', self.item['code']), dp(36)))
+
+    def bind_item(self, item):
+        super().bind_item(item)
+        self.lbl.text = ar(f"تسجيل: {item['name']}")
+
+
+class PdfRequestRow(RequestRow):
+    def build(self):
+        super().build()
+        self.add_widget(action_btn('سماح', C_BLUE, lambda x: self._call('_approve_pdf', self.item['pdf_id'], self.item['code']), dp(36)))
+        self.add_widget(action_btn('سماح للكل', C_GREEN, lambda x: self._call('_approve_pdf_all', self.item['pdf_id']), dp(36), dp(11)))
+
+    def bind_item(self, item):
+        super().bind_item(item)
+        self.lbl.text = ar(f"تحميل: {item['title']}")
+
+
+class StudentRow(AdminListRow):
+    def build(self):
+        self.padding, self.spacing = [dp(12), dp(5)], dp(8)
+        make_card_bg(self)
+        self.name_lbl = Label(bold=True, font_name=App.get_running_app().font_name, halign='right', size_hint_x=0.4)
+        self.code_lbl = Label(color=get_color_from_hex(C_SUB), font_size=dp(11), size_hint_x=0.2)
+        self.add_widget(self.name_lbl); self.add_widget(self.code_lbl)
+        self.add_widget(action_btn('تعديل', C_BLUE, lambda x: self._call('show_edit_student_dialog', self.item['code'], self.item['data']), dp(38), dp(11)))
+        self.add_widget(action_btn('حذف', C_RED, lambda x: self._call('_del_student', self.item['code']), dp(38), dp(11)))
+
+    def bind_item(self, item):
+        self.name_lbl.text = ar(item['data'].get('name', ''))
+        self.code_lbl.text = f"#{item['code']}"
+
+
+# --- بطاقات تُعاد من مخزن (WidgetPool) وتُربط ببيانات جديدة بدلاً من إنشائها عند كل تحديث ---
+class SubjectAdminCard(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(orientation='vertical', size_hint_y=None, height=dp(80), padding=dp(10), spacing=dp(5), **kwargs)
+        make_card_bg(self)
+        font = App.get_running_app().font_name
+        row1 = BoxLayout(size_hint_y=None, height=dp(30))
+        self.name_lbl = Label(bold=True, font_name=font, halign='right')
+        row1.add_widget(self.name_lbl)
+        row1.add_widget(action_btn('🗑️', C_RED, lambda x: self.owner._del_sub(self.sid), dp(30)))
+        self.add_widget(row1)
+        row2 = BoxLayout(size_hint_y=None, height=dp(25))
+        self.doctor_lbl = Label(font_size=dp(11), color=get_color_from_hex(C_SUB), font_name=font, halign='right')
+        row2.add_widget(self.doctor_lbl)
+        row2.add_widget(action_btn('الملفات', C_BLUE, lambda x: self.owner._manage_pdfs(self.sid, self.sdata), dp(28)))
+        self.add_widget(row2)
+
+    def bind_data(self, owner, sid, s):
+        self.owner, self.sid, self.sdata = owner, sid, s
+        self.name_lbl.text = ar(s.get('name', ''))
+        self.doctor_lbl.text = ar(f"د. {s.get('doctor', '')}")
+
+
+class PdfTitleRow(BoxLayout):
+    def __init__(self, **kwargs):
+        super().__init__(size_hint_y=None, height=dp(35), **kwargs)
+        make_card_bg(self, '#334155')
+        self.lbl = Label(font_name=App.get_running_app().font_name, halign='right')
+        self.add_widget(self.lbl)
+
+    def bind_data(self, title):
+        self.lbl.text = ar(title)
+
+
 class AdminScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.app = App.get_running_app()
         self.current_tab = 0
+        self._active = self._subscribed = self._migrations_scheduled = False
+        # كل تبويب يُبنى مرة ويُعاد عرضه؛ يُبنى من جديد فقط إذا تغيرت بياناته وهو غير ظاهر
+        self._tabs = TabCache(self._build_tab, {
+            0: ('students', 'pending_requests', 'pdfs'), 1: ('subjects',), 2: ('admin_settings',),
+        }, on_drop=self._release_tab)
+        self._sub_pool, self._pdf_row_pool = WidgetPool(SubjectAdminCard), WidgetPool(PdfTitleRow)
         self.setup_ui()
 
     def setup_ui(self):
@@ -95,20 +238,85 @@ class AdminScreen(Screen):
         self.root.add_widget(main_box)
         self.add_widget(self.root)
 
-    def on_enter(self): self._update_badge(); self.switch_tab(self.current_tab)
+    def on_enter(self):
+        if not self._migrations_scheduled:
+            # مرة واحدة فقط إن وُجدت بيانات بالشكل القديم، وبعد وصول بيانات السيرفر لا النسخة المحفوظة على الجهاز
+            self._migrations_scheduled = True
+            FirebaseManager.when_confirmed('pdfs', FirebaseManager.migrate_pdf_access_schema)
+            FirebaseManager.when_confirmed('announcements', FirebaseManager.migrate_announcements_schema)
+        if not self._subscribed:
+            # الاشتراك يبقى بعد مغادرة الشاشة حتى تُبطل التبويبات المحفوظة التي تغيرت بياناتها
+            FirebaseManager.subscribe(('students', 'pending_requests', 'pdfs', 'subjects', 'admin_settings'), self._on_data_changed)
+            self._subscribed = True
+        self._active = True
+        self._update_badge(); self.switch_tab(self.current_tab)
+
+    def on_leave(self):
+        self._active = False
+
+    def _on_data_changed(self, changes):
+        """ تعديل الصفوف المتأثرة فقط بدلاً من إعادة بناء القائمة كاملة """
+        collections = {ch.collection for ch in changes}
+        if not self._active:
+            self._tabs.invalidate(collections)
+            return
+        # التبويبان 0 و 1 يحدّثان نفسيهما في مكانهما، وباقي التبويبات المحفوظة تُبنى من جديد عند فتحها
+        self._tabs.invalidate(collections, keep=self.current_tab if self.current_tab in (0, 1) else None)
+        if self.current_tab == 0:
+            for ch in changes:
+                if ch.collection == 'students':
+                    self._patch_item(self._student_rows, ch.key, self._student_item(ch.key, ch.new) if ch.new else None)
+                elif ch.collection == 'pending_requests':
+                    self._patch_item(self._pending_rows, ch.key, self._pending_item(ch.key, ch.new) if ch.new else None)
+                elif ch.collection == 'pdfs':
+                    self._patch_pdf_requests(ch)
+            self._sync_student_list()
+        elif self.current_tab == 1:
+            for ch in changes:
+                if ch.collection != 'subjects': continue
+                if ch.new and ch.key in self._sub_cards:
+                    self._sub_cards[ch.key].bind_data(self, ch.key, ch.new)
+                else:
+                    self._patch_row(self.sub_inner, self._sub_cards, ch.key, self._sub_card(ch.key, ch.new) if ch.new else None, self._sub_pool)
+        self._update_badge()
+
+    @staticmethod
+    def _patch_row(box, rows, key, new_row, pool=None):
+        """ استبدال صف واحد في مكانه أو إضافته أو حذفه (الصف المحذوف يعود لمخزنه إن وُجد) """
+        old_row = rows.pop(key, None)
+        if new_row is not None:
+            rows[key] = new_row
+            if old_row is not None:
+                box.add_widget(new_row, index=box.children.index(old_row))
+            else:
+                box.add_widget(new_row)
+        if old_row is not None:
+            box.remove_widget(old_row)
+            if pool is not None: pool.release(old_row)
+
+    @staticmethod
+    def _patch_item(rows, key, item):
+        """ نفس _patch_row لكن على نموذج بيانات قائمة RecycleView (العنصر يبقى في مكانه) """
+        if item is None: rows.pop(key, None)
+        else: rows[key] = item
 
     def switch_tab(self, idx):
         self.current_tab = idx; self.tab_bar.select(idx)
         self.content.clear_widgets()
-        if   idx == 0: self.build_student_settings_tab()
-        elif idx == 1: self.build_subjects_tab()
-        elif idx == 2: self.build_admin_settings_tab()
+        self.content.add_widget(self._tabs.get(idx)[0])
         self._update_badge()
 
+    def _build_tab(self, idx):
+        if   idx == 0: return self.build_student_settings_tab()
+        elif idx == 1: return self.build_subjects_tab()
+        elif idx == 2: return self.build_admin_settings_tab()
+
+    def _release_tab(self, idx, view):
+        if idx == 1: self._sub_pool.release_all(self.sub_inner.children)
+
     # ❶ إعدادات الطلاب (الطلاب + المتابعة)
     def build_student_settings_tab(self):
         layout = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
-        self.content.add_widget(layout)
 
         # قسم التنبيه السريع
         ann_box = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(8))
@@ -117,55 +325,92 @@ class AdminScreen(Screen):
         ann_box.add_widget(action_btn('نشر', C_BLUE, self._post_ann, dp(44)))
         layout.add_widget(ann_box)
 
-        scroll = ScrollView()
-        self.inner = BoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(10))
-        self.inner.bind(minimum_height=self.inner.setter('height'))
-        scroll.add_widget(self.inner)
-        layout.add_widget(scroll)
+        self.students_rv = RecycleView()
+        rv_layout = RecycleBoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(10),
+                                     default_size=(None, dp(55)), default_size_hint=(1, None), key_viewclass='viewclass')
+        rv_layout.bind(minimum_height=rv_layout.setter('height'))
+        self.students_rv.add_widget(rv_layout)
+        layout.add_widget(self.students_rv)
         self._refresh_student_settings()
+        return layout
 
     def _refresh_student_settings(self):
-        self.inner.clear_widgets()
-        
-        # 1. طلبات التسجيل والتحميل
-        pending = FirebaseManager.get_pending_requests()
-        pdf_reqs = FirebaseManager.get_pdf_download_requests()
-        if pending or pdf_reqs:
-            self.inner.add_widget(Label(text=ar('⚠️ طلبات بانتظار الموافقة'), font_name=self.app.font_name, color=get_color_from_hex(C_YELLOW), size_hint_y=None, height=dp(30), halign='right'))
-            for c, d in pending.items():
-                row = BoxLayout(size_hint_y=None, height=dp(50), padding=[dp(10), 0], spacing=dp(8))
-                make_card_bg(row, '#1c2744')
-                row.add_widget(Label(text=ar(f"تسجيل: {d['name']}"), font_name=self.app.font_name, halign='right', size_hint_x=0.5))
-                row.add_widget(action_btn('قبول', C_GREEN, lambda x, code=c: self._approve_reg(code), dp(36)))
-                row.add_widget(action_btn('رفض', C_RED, lambda x, code=c: self._reject_reg(code), dp(36)))
-                self.inner.add_widget(row)
-            for r in pdf_reqs:
-                row = BoxLayout(size_hint_y=None, height=dp(50), padding=[dp(10), 0], spacing=dp(8))
-                make_card_bg(row, '#1c2744')
-                row.add_widget(Label(text=ar(f"تحميل: {r['pdf_title']}"), font_name=self.app.font_name, halign='right', size_hint_x=0.5))
-                row.add_widget(action_btn('سماح', C_BLUE, lambda x, p=r['pdf_id'], c=r['student_code']: self._approve_pdf(p, c), dp(36)))
-                self.inner.add_widget(row)
+        # نموذج بيانات فقط: القائمة تنشئ صفوفاً بعدد الظاهر على الشاشة وتعيد استخدامها أثناء التمرير
+        self._pending_rows, self._pdf_rows, self._student_rows = {}, {}, {}
+        self._selected = set()   # ('reg', code) أو ('pdf', pdf_id, code)
+        for c, d in FirebaseManager.get_pending_requests().items():
+            self._pending_rows[c] = self._pending_item(c, d)
+        for r in FirebaseManager.get_pdf_download_requests():
+            self._pdf_rows[(r['pdf_id'], r['student_code'])] = self._pdf_req_item(r)
+        for code, data in FirebaseManager.get_students().items():
+            self._student_rows[code] = self._student_item(code, data)
+        self._sync_student_list()
 
+    def _sync_student_list(self):
+        data = []
+        # 1. طلبات التسجيل والتحميل
+        if self._pending_rows or self._pdf_rows:
+            data.append({'viewclass': 'PendingHeader', 'owner': self, 'height': dp(76)})
+            data.extend(self._pending_rows.values())
+            data.extend(self._pdf_rows.values())
         # 2. قائمة الطلاب
-        self.inner.add_widget(Label(text=ar('👥 قائمة الطلاب'), font_name=self.app.font_name, color=get_color_from_hex(C_SUB), size_hint_y=None, height=dp(30), halign='right'))
-        btn_bar = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
-        btn_bar.add_widget(action_btn('إضافة طالب جديد', C_GREEN, self.show_add_student_dialog, dp(40)))
-        self.inner.add_widget(btn_bar)
-
-        students = FirebaseManager.get_students()
-        for code, data in students.items():
-            row = BoxLayout(size_hint_y=None, height=dp(55), padding=[dp(12), dp(5)], spacing=dp(8))
-            make_card_bg(row)
-            row.add_widget(Label(text=ar(data['name']), bold=True, font_name=self.app.font_name, halign='right', size_hint_x=0.4))
-            row.add_widget(Label(text=f'#{code}', color=get_color_from_hex(C_SUB), font_size=dp(11), size_hint_x=0.2))
-            row.add_widget(action_btn('تعديل', C_BLUE, lambda x, c=code, d=data: self.show_edit_student_dialog(c, d), dp(38), dp(11)))
-            row.add_widget(action_btn('حذف', C_RED, lambda x, c=code: self._del_student(c), dp(38), dp(11)))
-            self.inner.add_widget(row)
+        data.append({'viewclass': 'SectionLabel', 'text': '👥 قائمة الطلاب', 'height': dp(30)})
+        data.append({'viewclass': 'StudentsBar', 'owner': self, 'height': dp(40)})
+        data.extend(self._student_rows.values())
+        self.students_rv.data = data
+
+    def _pending_item(self, c, d):
+        return {'viewclass': 'PendingRow', 'owner': self, 'key': ('reg', c), 'code': c, 'name': d.get('name', ''), 'height': dp(50)}
+
+    def _pdf_req_item(self, r):
+        return {'viewclass': 'PdfRequestRow', 'owner': self, 'key': ('pdf', r['pdf_id'], r['student_code']),
+                'pdf_id': r['pdf_id'], 'code': r['student_code'], 'title': r['pdf_title'], 'height': dp(50)}
+
+    def _student_item(self, code, data):
+        return {'viewclass': 'StudentRow', 'owner': self, 'code': code, 'data': data, 'height': dp(55)}
+
+    def _set_selected(self, key, on):
+        if on: self._selected.add(key)
+        else: self._selected.discard(key)
+
+    def _bulk_resolve(self, approve, selected=False):
+        """ قبول/رفض المحدد أو كل الطلبات: كتابة واحدة لكل نوع، والواجهة تتحدث مرة واحدة عبر _on_data_changed """
+        if selected:
+            regs = [k[1] for k in self._selected if k[0] == 'reg' and k[1] in self._pending_rows]
+            pdfs = [k[1:] for k in self._selected if k[0] == 'pdf' and k[1:] in self._pdf_rows]
+            if regs or pdfs: self._resolve(approve, regs, pdfs)
+            return
+        # الكل: القوائم تُثبت لحظة التأكيد فلا يُنفذ إلا ما عرضت أعداده (لا طلبات وصلت بعدها)
+        regs = list(FirebaseManager.get_pending_requests())
+        pdfs = [(r['pdf_id'], r['student_code']) for r in FirebaseManager.get_pdf_download_requests()]
+        if not regs and not pdfs: return
+        action = 'قبول' if approve else 'رفض'
+        self._confirm([f"{action} كل الطلبات المعلقة؟", f"طلبات تسجيل: {len(regs)}", f"طلبات تحميل: {len(pdfs)}"],
+                      lambda: self._resolve(approve, regs, pdfs), C_GREEN if approve else C_RED)
+
+    def _resolve(self, approve, regs, pdfs):
+        self._selected.clear()
+        run_async(self._resolve_async(approve, regs, pdfs))
+
+    async def _resolve_async(self, approve, regs, pdfs):
+        """ التسجيلات وطلبات التحميل عمليتان مستقلتان: تُرسلان معاً (نفس الـ PATCH) ويُنتظر تأكيدهما معاً """
+        regs_op = AsyncFirebaseManager.approve_requests(regs) if approve else AsyncFirebaseManager.reject_requests(regs)
+        results = await AsyncFirebaseManager.gather(regs_op, AsyncFirebaseManager.resolve_pdf_requests(pdfs, approve))
+        if any(isinstance(r, Exception) for r in results):
+            self._notify('تعذر تأكيد بعض الطلبات من السيرفر، ستُعاد المحاولة تلقائياً')
+
+    def _patch_pdf_requests(self, ch):
+        """ مزامنة عناصر طلبات التحميل لملف واحد مع الفهرس """
+        pid = ch.key
+        wanted = {(r['pdf_id'], r['student_code']): r for r in FirebaseManager.get_pdf_download_requests(pid)}
+        for key in [k for k in self._pdf_rows if k[0] == pid]:
+            if key not in wanted: del self._pdf_rows[key]
+        for key, r in wanted.items():
+            self._pdf_rows[key] = self._pdf_req_item(r)
 
     # ❷ المواد (نفس الهيكلية السابقة مع تحسين)
     def build_subjects_tab(self):
         layout = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
-        self.content.add_widget(layout)
         bar = BoxLayout(size_hint_y=None, height=dp(44), spacing=dp(8))
         bar.add_widget(Label(text=ar('إدارة المواد الدراسية'), font_size=dp(15), bold=True, font_name=self.app.font_name, halign='right'))
         bar.add_widget(action_btn('مادة جديدة', C_BLUE, self.show_add_subject_dialog, dp(42)))
@@ -177,27 +422,20 @@ class AdminScreen(Screen):
         scroll.add_widget(self.sub_inner)
         layout.add_widget(scroll)
         self._refresh_subs()
+        return layout
 
     def _refresh_subs(self):
-        self.sub_inner.clear_widgets()
-        subs = FirebaseManager.get_subjects()
-        for sid, s in subs.items():
-            card = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(80), padding=dp(10), spacing=dp(5))
-            make_card_bg(card)
-            row1 = BoxLayout(size_hint_y=None, height=dp(30))
-            row1.add_widget(Label(text=ar(s['name']), bold=True, font_name=self.app.font_name, halign='right'))
-            row1.add_widget(action_btn('🗑️', C_RED, lambda x, i=sid: self._del_sub(i), dp(30)))
-            card.add_widget(row1)
-            row2 = BoxLayout(size_hint_y=None, height=dp(25))
-            row2.add_widget(Label(text=ar(f"د. {s['doctor']}"), font_size=dp(11), color=get_color_from_hex(C_SUB), font_name=self.app.font_name, halign='right'))
-            row2.add_widget(action_btn('الملفات', C_BLUE, lambda x, i=sid, d=s: self._manage_pdfs(i, d), dp(28)))
-            card.add_widget(row2)
-            self.sub_inner.add_widget(card)
+        self._sub_pool.release_all(self.sub_inner.children)
+        self._sub_cards = {}
+        for sid, s in FirebaseManager.get_subjects().items():
+            self._patch_row(self.sub_inner, self._sub_cards, sid, self._sub_card(sid, s))
+
+    def _sub_card(self, sid, s):
+        return self._sub_pool.acquire(self, sid, s)
 
     # ❸ إعدادات الأدمن
     def build_admin_settings_tab(self):
         layout = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(20))
-        self.content.add_widget(layout)
         settings = FirebaseManager.get_admin_settings()
         
         layout.add_widget(Label(text=ar('إعدادات النظام'), font_size=dp(16), bold=True, font_name=self.app.font_name, color=get_color_from_hex(C_YELLOW), halign='right'))
@@ -210,9 +448,9 @@ class AdminScreen(Screen):
         
         def save(x):
             FirebaseManager.save_admin_settings({'center_name': name_in.text, 'theme': 'dark'})
-            self.switch_tab(2)
 
         layout.add_widget(action_btn('حفظ البيانات', C_GREEN, save, dp(48)))
+        return layout
 
     # --- Dialogs & Functions ---
     def show_edit_student_dialog(self, code, data):
@@ -224,7 +462,7 @@ class AdminScreen(Screen):
         popup = Popup(title='', content=content, size_hint=(0.85, 0.5), separator_height=0)
         def save(x):
             FirebaseManager.save_student(code, {'name': n_in.text, 'password': p_in.text, 'materials': data.get('materials',[])})
-            popup.dismiss(); self._refresh_student_settings()
+            popup.dismiss()
         content.add_widget(action_btn('تحديث', C_BLUE, save))
         popup.open()
 
@@ -238,18 +476,93 @@ class AdminScreen(Screen):
         def save(x):
             if n_in.text and c_in.text:
                 FirebaseManager.save_student(c_in.text, {'name': n_in.text, 'password': p_in.text, 'materials': []})
-                popup.dismiss(); self._refresh_student_settings()
+                popup.dismiss()
         content.add_widget(action_btn('إضافة', C_GREEN, save))
         popup.open()
 
-    def _del_student(self, c): FirebaseManager.delete_student(c); self._refresh_student_settings()
-    def _approve_reg(self, c): FirebaseManager.approve_request(c); self._refresh_student_settings()
-    def _reject_reg(self, c): FirebaseManager.reject_request(c); self._refresh_student_settings()
-    def _approve_pdf(self, p, c): FirebaseManager.approve_pdf_access(p, c); self._refresh_student_settings()
+    def show_import_students_dialog(self, *a):
+        from kivy.uix.filechooser import FileChooserIconView
+        f_box = BoxLayout(orientation='vertical', spacing=dp(5), padding=dp(10))
+        f_box.add_widget(Label(text=ar('الأعمدة: الاسم، الكود، كلمة المرور'), font_name=self.app.font_name, size_hint_y=None, height=dp(30)))
+        default_path = '/sdcard' if platform == 'android' else '.'
+        chooser = FileChooserIconView(filters=['*.csv'], path=default_path)
+        f_box.add_widget(chooser)
+        f_popup = Popup(title=ar('اختر ملف CSV'), content=f_box, size_hint=(0.95, 0.95))
+
+        def on_select(inst):
+            if chooser.selection:
+                f_popup.dismiss()
+                self._import_students(chooser.selection[0])
+
+        f_box.add_widget(action_btn('استيراد الملف المختار', C_GREEN, on_select, dp(45)))
+        f_box.add_widget(action_btn('إلغاء', C_RED, lambda x: f_popup.dismiss(), dp(40)))
+        f_popup.open()
+
+    def _import_students(self, path):
+        from kivy.uix.progressbar import ProgressBar
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
+        bar = ProgressBar(max=1.0, size_hint_y=None, height=dp(20))
+        status = Label(text=ar('جاري الاستيراد...'), font_name=self.app.font_name, halign='right')
+        status.bind(size=status.setter('text_size'))
+        close_btn = action_btn('إغلاق', '#64748b', lambda x: popup.dismiss(), dp(40))
+        close_btn.disabled = True
+        content.add_widget(bar); content.add_widget(status); content.add_widget(close_btn)
+        popup = Popup(title='', content=content, size_hint=(0.9, 0.7), separator_height=0, auto_dismiss=False)
+
+        def on_progress(report):
+            bar.value = report.fraction
+            status.text = ar(f"صفوف: {report.rows} | مضاف: {report.imported} | أخطاء: {len(report.errors)}")
+
+        def on_done(report):
+            bar.value = 1.0
+            lines = [f"تمت إضافة {report.imported} طالب (أكد السيرفر {report.confirmed})",
+                     f"مكرر: {len(report.duplicates)} | أخطاء أخرى: {len(report.errors) - len(report.duplicates)}"]
+            status.text = '\n'.join(ar(l) for l in lines + report.summary())
+            close_btn.disabled = False
+
+        try:
+            FirebaseManager.import_students(path, on_progress, on_done)
+        except OSError as e:
+            status.text = ar(f"تعذر فتح الملف: {e}")
+            close_btn.disabled = False
+        popup.open()
+
+    # الصفوف المتأثرة تُحدّث عبر _on_data_changed
+    def _del_student(self, c): FirebaseManager.delete_student(c)
+    def _approve_reg(self, c): FirebaseManager.approve_request(c)
+    def _reject_reg(self, c): FirebaseManager.reject_request(c)
+    def _approve_pdf(self, p, c): FirebaseManager.approve_pdf_access(p, c)
+    def _approve_pdf_all(self, p):
+        requests = [(p, r['student_code']) for r in FirebaseManager.get_pdf_download_requests(p)]
+        if not requests: return
+        title = FirebaseManager.get_pdfs().get(p, {}).get('title', p)
+        self._confirm([f"السماح لكل الطلاب بتحميل: {title}؟", f"عدد الطلبات: {len(requests)}"],
+                      lambda: FirebaseManager.resolve_pdf_requests(requests))
+
+    def _notify(self, text):
+        msg = Label(text=ar(text), font_name=self.app.font_name, halign='center')
+        msg.bind(size=msg.setter('text_size'))
+        Popup(title='', content=msg, size_hint=(0.85, 0.3), separator_height=0).open()
+
+    def _confirm(self, lines, on_yes, color=C_GREEN):
+        """ نافذة تأكيد بأعداد العناصر قبل أي عملية على كل العناصر """
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
+        msg = Label(text='\n'.join(ar(l) for l in lines), font_name=self.app.font_name, halign='center')
+        msg.bind(size=msg.setter('text_size'))
+        content.add_widget(msg)
+        popup = Popup(title='', content=content, size_hint=(0.85, 0.4), separator_height=0)
+        def yes(x):
+            popup.dismiss()
+            on_yes()
+        btns = BoxLayout(size_hint_y=None, height=dp(45), spacing=dp(10))
+        btns.add_widget(action_btn('تأكيد', color, yes, dp(45)))
+        btns.add_widget(action_btn('إلغاء', '#64748b', lambda x: popup.dismiss(), dp(45)))
+        content.add_widget(btns)
+        popup.open()
     
     def _post_ann(self, *a):
         txt = self.ann_in.text.strip()
-        if txt: FirebaseManager.add_announcement(txt); self.ann_in.text = ''; self._refresh_student_settings()
+        if txt: FirebaseManager.add_announcement(txt); self.ann_in.text = ''
 
     def show_add_subject_dialog(self, *a):
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
@@ -260,11 +573,11 @@ class AdminScreen(Screen):
         def save(x):
             if n_in.text:
                 FirebaseManager.save_subject(str(int(time.time())), n_in.text, d_in.text)
-                popup.dismiss(); self._refresh_subs()
+                popup.dismiss()
         content.add_widget(action_btn('حفظ', C_GREEN, save))
         popup.open()
 
-    def _del_sub(self, i): FirebaseManager.delete_subject(i); self._refresh_subs()
+    def _del_sub(self, i): FirebaseManager.delete_subject(i)
 
     def _manage_pdfs(self, sid, sdata):
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(15))
@@ -274,11 +587,10 @@ class AdminScreen(Screen):
         all_pdfs = FirebaseManager.get_pdfs(); sub_pdfs = sdata.get('pdfs',[])
         for pid in sub_pdfs:
             if pid in all_pdfs:
-                row = BoxLayout(size_hint_y=None, height=dp(35)); make_card_bg(row, '#334155')
-                row.add_widget(Label(text=ar(all_pdfs[pid]['title']), font_name=self.app.font_name, halign='right'))
-                inner.add_widget(row)
+                inner.add_widget(self._pdf_row_pool.acquire(all_pdfs[pid]['title']))
         content.add_widget(scroll)
         popup = Popup(title='', content=content, size_hint=(0.9, 0.7), separator_height=0)
+        popup.bind(on_dismiss=lambda *x: self._pdf_row_pool.release_all(inner.children))
         content.add_widget(action_btn('رفع ملف', C_GREEN, lambda x: self.show_upload_pdf_dialog(sid), dp(40)))
         content.add_widget(action_btn('إغلاق', '#64748b', lambda x: popup.dismiss(), dp(40)))
         popup.open()
@@ -292,7 +604,7 @@ class AdminScreen(Screen):
             from kivy.uix.filechooser import FileChooserIconView
             f_box = BoxLayout(orientation='vertical', spacing=dp(5), padding=dp(10))
             # تحديد المسار الافتراضي للأندرويد أو الكمبيوتر
-            default_path = '/sdcard' if self.app.platform == 'android' else '.'
+            default_path = '/sdcard' if platform == 'android' else '.'
             chooser = FileChooserIconView(filters=['*.pdf'], path=default_path)
             f_box.add_widget(chooser)
             
@@ -314,19 +626,36 @@ class AdminScreen(Screen):
         content.add_widget(t_i); content.add_widget(u_i)
         content.add_widget(action_btn('📁 اختر ملف من جهازك', C_YELLOW, open_chooser, dp(45)))
         
+        status = Label(text='', font_name=self.app.font_name, font_size=dp(12), color=get_color_from_hex(C_RED), size_hint_y=None, height=dp(20))
         popup = Popup(title='', content=content, size_hint=(0.85, 0.65), separator_height=0)
         def save(x):
             if not t_i.text or not u_i.text: return
             pid = f"pdf_{int(time.time())}"
-            FirebaseManager.save_pdf(pid, t_i.text, u_i.text, True)
-            FirebaseManager.add_pdf_to_subject(sid, pid)
-            popup.dismiss(); self._refresh_subs()
-            
-        content.add_widget(action_btn('حفظ البيانات', C_BLUE, save))
+            title, url = t_i.text, u_i.text
+
+            # الربط بالمادة أولاً (كتابة مشروطة لا تُحفظ في السجل): الملف لا يُحفظ إلا إذا أكد السيرفر الربط
+            # حتى لا يبقى ملف بدون مادة إذا فشل الربط أو كان الجهاز بدون اتصال
+            def linked(ok):
+                if ok:
+                    FirebaseManager.save_pdf(pid, title, url, True)
+                    popup.dismiss()
+                else:
+                    save_btn.disabled = False
+                    status.text = ar('تعذر ربط الملف بالمادة، تحقق من الاتصال وحاول مرة أخرى')
+
+            if FirebaseManager.add_pdf_to_subject(sid, pid, on_done=linked):
+                save_btn.disabled = True
+                status.text = ''
+            else:
+                status.text = ar('المادة غير موجودة')
+
+        save_btn = action_btn('حفظ البيانات', C_BLUE, save)
+        content.add_widget(status)
+        content.add_widget(save_btn)
         popup.open()
 
     def _update_badge(self):
-        t = len(FirebaseManager.get_pending_requests()) + len(FirebaseManager.get_pdf_download_requests())
+        t = len(FirebaseManager.get_pending_requests()) + FirebaseManager.count_pdf_download_requests()
         self.badge.text = f'({t})' if t > 0 else ''
 
     def logout(self, *a):
@@ -9,10 +9,15 @@ from kivy.uix.switch import Switch
 from kivy.uix.textinput import TextInput
 from kivy.uix.behaviors import ButtonBehavior
 from kivy.uix.popup import Popup
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.graphics import Color, RoundedRectangle
 from kivy.metrics import dp
 from kivy.utils import get_color_from_hex
 from utils.arabic_utils import ar
+from utils.tab_cache import TabCache
+from utils.widget_pool import WidgetPool
 import time
 
 # الألوان
@@ -32,37 +37,54 @@ def make_card_bg(widget, color=C_CARD, radius=12):
     return clr, r
 
 class SubjectCard(ButtonBehavior, BoxLayout):
-    def __init__(self, sub_id, name, doctor, on_click, **kwargs):
+    def __init__(self, sub_id=None, name='', doctor='', on_click=None, **kwargs):
         super().__init__(**kwargs)
         self.size_hint_y = None; self.height = dp(80); self.padding = dp(12)
         make_card_bg(self)
-        self.add_widget(Label(text=ar(name), font_size=dp(17), bold=True, font_name=App.get_running_app().font_name, halign='right'))
-        self.bind(on_release=lambda x: on_click(sub_id, name))
+        self.name_lbl = Label(font_size=dp(17), bold=True, font_name=App.get_running_app().font_name, halign='right')
+        self.add_widget(self.name_lbl)
+        self.bind(on_release=lambda x: self._on_click and self._on_click(self.sub_id, self.name))
+        self.bind_data(sub_id, name, doctor, on_click)
+
+    def bind_data(self, sub_id, name, doctor, on_click):
+        """ ربط بيانات مادة بالبطاقة (تُستخدم عند إعادة استخدامها من المخزن) """
+        self.sub_id, self.name, self.doctor, self._on_click = sub_id, name, doctor, on_click
+        self.name_lbl.text = ar(name)
 
 class PDFCard(BoxLayout):
-    def __init__(self, pdf_id, pdf_data, student_code, **kwargs):
+    def __init__(self, pdf_id=None, pdf_data=None, student_code=None, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'vertical'; self.size_hint_y = None; self.height = dp(85); self.padding = dp(10)
         make_card_bg(self, '#262f45')
-        
-        title = pdf_data.get('title', 'ملف')
-        approved = student_code in pdf_data.get('approved_students', [])
-        pending = student_code in pdf_data.get('pending_download_requests', [])
-        
-        self.add_widget(Label(text=ar(title), font_name=App.get_running_app().font_name, halign='right'))
-        
-        btn_box = BoxLayout(size_hint_y=None, height=dp(34), spacing=dp(8))
-        if approved:
-            dl = Button(text=ar('⬇️ تحميل'), font_name=App.get_running_app().font_name, background_color=get_color_from_hex(C_GREEN), background_normal='')
-            dl.bind(on_release=lambda x: self._download(pdf_data.get('url','')))
-            btn_box.add_widget(dl)
-        elif pending:
-            btn_box.add_widget(Label(text=ar('⏳ طلبك قيد المراجعة'), font_name=App.get_running_app().font_name, color=get_color_from_hex(C_YELLOW)))
-        else:
-            req = Button(text=ar('طلب الإذن'), font_name=App.get_running_app().font_name, background_color=get_color_from_hex(C_BLUE), background_normal='')
-            req.bind(on_release=lambda x: self._req(pdf_id, student_code, x))
-            btn_box.add_widget(req)
-        self.add_widget(btn_box)
+        font = App.get_running_app().font_name
+        self.title_lbl = Label(font_name=font, halign='right')
+        self.btn_box = BoxLayout(size_hint_y=None, height=dp(34), spacing=dp(8))
+        self.add_widget(self.title_lbl)
+        self.add_widget(self.btn_box)
+        # حالات الصلاحية الثلاث تُنشأ مرة واحدة ويُعرض منها المناسب
+        self.dl_btn = Button(text=ar('⬇️ تحميل'), font_name=font, background_color=get_color_from_hex(C_GREEN), background_normal='')
+        self.dl_btn.bind(on_release=lambda x: self._download(self.pdf_data.get('url', '')))
+        self.pending_lbl = Label(text=ar('⏳ طلبك قيد المراجعة'), font_name=font, color=get_color_from_hex(C_YELLOW))
+        self.req_btn = Button(font_name=font, background_color=get_color_from_hex(C_BLUE), background_normal='')
+        self.req_btn.bind(on_release=lambda x: self._req(self.pdf_id, self.student_code, x))
+        if pdf_data is not None: self.bind_data(pdf_id, pdf_data, student_code)
+
+    def bind_data(self, pdf_id, pdf_data, student_code):
+        self.pdf_id, self.student_code = pdf_id, student_code
+        self.req_btn.text, self.req_btn.disabled = ar('طلب الإذن'), False
+        self.refresh(pdf_data)
+
+    def refresh(self, pdf_data):
+        """ تحديث العنوان وحالة الصلاحية بعد تغير بيانات الملف """
+        from utils.firebase_manager import FirebaseManager
+        self.pdf_data = pdf_data
+        self.title_lbl.text = ar(pdf_data.get('title', 'ملف'))
+        if FirebaseManager.has_pdf_access(self.pdf_id, self.student_code): state = self.dl_btn
+        elif FirebaseManager.is_pdf_access_pending(self.pdf_id, self.student_code): state = self.pending_lbl
+        else: state = self.req_btn
+        if state.parent is not self.btn_box:
+            self.btn_box.clear_widgets()
+            self.btn_box.add_widget(state)
 
     def _req(self, pid, code, inst):
         from utils.firebase_manager import FirebaseManager
@@ -72,11 +94,44 @@ class PDFCard(BoxLayout):
     def _download(self, url):
         import webbrowser; webbrowser.open(url)
 
+class FeedLabel(RecycleDataViewBehavior, Label):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.font_name = App.get_running_app().font_name; self.halign = 'right'
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.text = ar(data['text'])
+        self.font_size, self.bold = data.get('font_size', dp(15)), data.get('bold', False)
+        self.color = get_color_from_hex(data.get('color', '#ffffff'))
+
+class AnnouncementCard(RecycleDataViewBehavior, BoxLayout):
+    """ بطاقة إعلان يُعاد استخدامها أثناء التمرير؛ النص يُشكّل عند أول ظهور فقط """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.orientation = 'vertical'; self.padding = dp(12); self.spacing = dp(5)
+        make_card_bg(self)
+        self.time_lbl = Label(font_size=dp(10), color=get_color_from_hex(C_BLUE), halign='right')
+        self.text_lbl = Label(font_size=dp(14), halign='right')
+        self.add_widget(self.time_lbl); self.add_widget(self.text_lbl)
+
+    def refresh_view_attrs(self, rv, index, data):
+        if 'shaped' not in data:
+            data['shaped'] = (ar(f"مدير المنصة - {data['time']}"), ar(data['text']))
+        self.time_lbl.text, self.text_lbl.text = data['shaped']
+
 class HomeScreen(Screen):
+    LOAD_RETRY_DELAY = 5  # ثوانٍ قبل محاولة تحميل صفحة أقدم مرة أخرى بعد فشل الطلب
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.app = App.get_running_app()
         self.current_tab = 'home'
+        self._active = self._subscribed = False
+        self._tabs_user = None
+        # كل تبويب يُبنى مرة ويُعاد عرضه؛ يُبنى من جديد فقط إذا تغيرت بياناته وهو غير ظاهر
+        self._tabs = TabCache(self._build_tab, {'home': ('announcements',), 'mats': ('subjects',)}, on_drop=self._release_tab)
+        self._subject_cards, self._pdf_cards = {}, {}
+        self._subject_pool, self._pdf_pool = WidgetPool(SubjectCard), WidgetPool(PDFCard)
         self.setup_ui()
 
     def setup_ui(self):
@@ -95,11 +150,24 @@ class HomeScreen(Screen):
         layout.add_widget(head)
 
         # Content
-        self.scroll = ScrollView(size_hint_y=0.82)
+        self.body = BoxLayout(size_hint_y=0.82)
+        self.scroll = ScrollView()
         self.content = BoxLayout(orientation='vertical', size_hint_y=None, padding=dp(15), spacing=dp(12))
         self.content.bind(minimum_height=self.content.setter('height'))
         self.scroll.add_widget(self.content)
-        layout.add_widget(self.scroll)
+        self.body.add_widget(self.scroll)
+        layout.add_widget(self.body)
+
+        # الإعلانات: بطاقات بعدد الظاهر فقط، والصفحات الأقدم تُحمّل عند الاقتراب من نهاية القائمة
+        self._ann_items, self._last_ann = {}, None
+        self._has_more = self._loading = False
+        self._feed_h, self._retry_at = 0, 0
+        self.feed = RecycleView()
+        feed_layout = RecycleBoxLayout(orientation='vertical', size_hint_y=None, padding=dp(15), spacing=dp(12),
+                                       default_size=(None, dp(100)), default_size_hint=(1, None), key_viewclass='viewclass')
+        feed_layout.bind(minimum_height=feed_layout.setter('height'), height=self._on_feed_height)
+        self.feed.add_widget(feed_layout)
+        self.feed.bind(scroll_y=self._maybe_load_more)
 
         # Nav
         self.nav = BoxLayout(size_hint_y=None, height=dp(60))
@@ -114,37 +182,168 @@ class HomeScreen(Screen):
         self.add_widget(self.root)
 
     def on_enter(self):
+        from utils.firebase_manager import FirebaseManager
         if self.app.username: self.welcome.text = ar(f"مرحباً، {self.app.username}")
+        if not self._subscribed:
+            # الاشتراك يبقى بعد مغادرة الشاشة حتى تُبطل التبويبات المحفوظة التي تغيرت بياناتها
+            FirebaseManager.subscribe(('announcements', 'subjects', 'pdfs'), self._on_data_changed)
+            self._subscribed = True
+        if self._tabs_user != self.app.user_code:
+            # صفحة الإعدادات تعرض بيانات الطالب
+            self._tabs.invalidate()
+            self._tabs_user = self.app.user_code
+        self._active = True
         self.switch_tab(self.current_tab)
 
+    def on_leave(self):
+        self._active = False
+
+    def _on_data_changed(self, changes):
+        """ تعديل البطاقات المتأثرة فقط (إعلان جديد، مادة تغيرت، صلاحية ملف) """
+        collections = {ch.collection for ch in changes}
+        if not self._active:
+            self._tabs.invalidate(collections)
+            return
+        self._tabs.invalidate(collections, keep=self.current_tab)
+        for ch in changes:
+            if ch.collection == 'pdfs' and ch.key in self._pdf_cards:
+                if ch.new: self._pdf_cards[ch.key].refresh(ch.new)
+            elif ch.collection == 'subjects' and self.current_tab == 'mats':
+                if ch.new and ch.key in self._subject_cards:
+                    self._bind_subject(self._subject_cards[ch.key], ch.key, ch.new)
+                else:
+                    self._patch_card(self._subject_cards, ch.key, self._subject_card(ch.key, ch.new) if ch.new else None)
+        anns = [ch for ch in changes if ch.collection == 'announcements']
+        if anns and self.current_tab == 'home':
+            if any(ch.key is None or ch.key.isdigit() for ch in anns):
+                # الشكل القديم (قائمة) يغير كل المواقع: إعادة بناء قسم الإعلانات
+                self._tabs.invalidate(('announcements',))
+                self.switch_tab('home')
+                return
+            for ch in anns:
+                self._patch_announcement(ch)
+            self._sync_feed()
+
+    def _patch_card(self, cards, key, new_card):
+        """ إضافة بطاقة أو حذفها (البطاقة المحذوفة تعود للمخزن) """
+        old_card = cards.pop(key, None)
+        if new_card is not None:
+            cards[key] = new_card
+            index = self.content.children.index(old_card) if old_card is not None else 0
+            self.content.add_widget(new_card, index=index)
+        if old_card is not None:
+            self._subject_pool.release(old_card)
+
+    def _patch_announcement(self, ch):
+        if ch.new is None:
+            self._ann_items.pop(ch.key, None)
+        elif ch.key in self._ann_items or self._last_ann is None or ch.key > self._last_ann:
+            self._ann_items[ch.key] = self._announcement_item(dict(ch.new, key=ch.key))
+        # الإعلانات الأقدم من المعروض تظهر عند تحميل الصفحة التالية
+
     def switch_tab(self, tab):
         self.current_tab = tab
-        self.content.clear_widgets()
-        if tab == 'home': self.build_home()
-        elif tab == 'mats': self.build_mats()
+        view = self._tabs.get(tab)[0]
+        # الرئيسية قائمة RecycleView مستقلة، وباقي التبويبات داخل ScrollView العادي
+        self.body.clear_widgets()
+        if tab == 'home':
+            self.body.add_widget(self.feed)
+            return
+        self.content = view
+        self.scroll.clear_widgets()
+        self.scroll.add_widget(view)
+        self.body.add_widget(self.scroll)
+
+    def _build_tab(self, tab):
+        if tab == 'home':
+            self.build_home()
+            return self.feed
+        self.content = BoxLayout(orientation='vertical', size_hint_y=None, padding=dp(15), spacing=dp(12))
+        self.content.bind(minimum_height=self.content.setter('height'))
+        if tab == 'mats': self.build_mats()
         elif tab == 'settings': self.build_settings()
+        return self.content
 
     def build_home(self):
         from utils.firebase_manager import FirebaseManager
-        self.content.add_widget(Label(text=ar('آخر الإعلانات'), font_size=dp(18), bold=True, font_name=self.app.font_name, halign='right', size_hint_y=None, height=dp(40)))
-        anns = FirebaseManager.get_announcements()
-        if not anns:
-            self.content.add_widget(Label(text=ar('لا توجد منشورات حالياً'), font_name=self.app.font_name, color=get_color_from_hex(C_SUB)))
+        self._ann_items, self._last_ann = {}, None
+        self._has_more = self._loading = False
+        self.feed.scroll_y = 1
+        self._add_announcements(FirebaseManager.get_announcements(limit=FirebaseManager.ANNOUNCEMENTS_PAGE))
+
+    def _add_announcements(self, anns):
+        from utils.firebase_manager import FirebaseManager
         for a in anns:
-            card = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(100), padding=dp(12), spacing=dp(5))
-            make_card_bg(card)
-            card.add_widget(Label(text=ar(f"مدير المنصة - {a['time']}"), font_size=dp(10), color=get_color_from_hex(C_BLUE), halign='right'))
-            card.add_widget(Label(text=ar(a['text']), font_size=dp(14), halign='right'))
-            self.content.add_widget(card)
+            self._ann_items[a['key']] = self._announcement_item(a)
+            self._last_ann = a['key']
+        # صفحة كاملة تعني أنه قد توجد إعلانات أقدم
+        self._has_more = len(anns) >= FirebaseManager.ANNOUNCEMENTS_PAGE
+        self._sync_feed()
+
+    def _sync_feed(self):
+        data = [{'viewclass': 'FeedLabel', 'text': 'آخر الإعلانات', 'font_size': dp(18), 'bold': True, 'height': dp(40)}]
+        if not self._ann_items:
+            data.append({'viewclass': 'FeedLabel', 'text': 'لا توجد منشورات حالياً', 'color': C_SUB, 'height': dp(60)})
+        data.extend(self._ann_items[k] for k in sorted(self._ann_items, reverse=True))
+        if self._loading:
+            data.append({'viewclass': 'FeedLabel', 'text': 'جاري تحميل إعلانات أقدم...', 'color': C_SUB, 'height': dp(44)})
+        self.feed.data = data
+
+    def _announcement_item(self, a):
+        return {'viewclass': 'AnnouncementCard', 'time': a.get('time', ''), 'text': a.get('text', ''), 'height': dp(100)}
+
+    def _on_feed_height(self, inst, h):
+        # تثبيت موضع القراءة عند إضافة صفحة أقدم (scroll_y نسبة من الارتفاع الكلي)
+        vh, old = self.feed.height, self._feed_h
+        self._feed_h = h
+        if old > vh and h > vh:
+            self.feed.scroll_y = max(0, 1 - (1 - self.feed.scroll_y) * (old - vh) / (h - vh))
+        self._maybe_load_more()
+
+    def _maybe_load_more(self, *a):
+        if self.current_tab != 'home' or not self._has_more or self._loading: return
+        if time.time() < self._retry_at: return
+        if self.feed.scroll_y <= 0.05 or self._feed_h <= self.feed.height:
+            self.load_more_announcements()
+
+    def load_more_announcements(self, *a):
+        from utils.firebase_manager import FirebaseManager
+        page = FirebaseManager.ANNOUNCEMENTS_PAGE
+        older = FirebaseManager.get_announcements(limit=page, before=self._last_ann)
+        if len(older) >= page:
+            self._add_announcements(older)
+            return
+        # النسخة المحلية انتهت: نطلب الصفحة التالية من السيرفر
+        self._loading = True
+        self._sync_feed()
+        def done(anns):
+            self._loading = False
+            if self.current_tab == 'home': self._add_announcements(anns)
+        def failed(err):
+            # الفشل لا يعني نهاية الإعلانات: نبقي _has_more ونعيد المحاولة عند التمرير بعد قليل
+            self._loading = False
+            self._retry_at = time.time() + self.LOAD_RETRY_DELAY
+            if self.current_tab == 'home': self._sync_feed()
+        FirebaseManager.fetch_announcements(page, self._last_ann, on_done=done, on_failure=failed)
 
     def build_mats(self):
         from utils.firebase_manager import FirebaseManager
+        self._subject_cards = {}
         self.content.add_widget(Label(text=ar('المواد الدراسية'), font_size=dp(18), bold=True, font_name=self.app.font_name, halign='right', size_hint_y=None, height=dp(40)))
         subs = FirebaseManager.get_subjects()
         if not subs:
             self.content.add_widget(Label(text=ar('سيتم إضافة المواد قريباً'), font_name=self.app.font_name, color=get_color_from_hex(C_SUB)))
         for sid, sdata in subs.items():
-            self.content.add_widget(SubjectCard(sid, sdata['name'], sdata['doctor'], self.show_sub_pdfs))
+            self._patch_card(self._subject_cards, sid, self._subject_card(sid, sdata))
+
+    def _subject_card(self, sid, sdata):
+        return self._subject_pool.acquire(sid, sdata.get('name', ''), sdata.get('doctor', ''), self.show_sub_pdfs)
+
+    def _bind_subject(self, card, sid, sdata):
+        card.bind_data(sid, sdata.get('name', ''), sdata.get('doctor', ''), self.show_sub_pdfs)
+
+    def _release_tab(self, tab, view):
+        if tab == 'mats': self._subject_pool.release_all([w for w in view.children if isinstance(w, SubjectCard)])
 
     def show_sub_pdfs(self, sid, name):
         from utils.firebase_manager import FirebaseManager
@@ -159,13 +358,21 @@ class HomeScreen(Screen):
             inner.add_widget(Label(text=ar('لا توجد ملفات حالياً'), font_name=self.app.font_name, color=get_color_from_hex(C_SUB)))
         else:
             for pid in sub_pdfs:
-                if pid in pdfs: inner.add_widget(PDFCard(pid, pdfs[pid], self.app.user_code))
+                if pid in pdfs:
+                    self._pdf_cards[pid] = self._pdf_pool.acquire(pid, pdfs[pid], self.app.user_code)
+                    inner.add_widget(self._pdf_cards[pid])
         
         content.add_widget(scroll)
         popup = Popup(title='', content=content, size_hint=(0.9, 0.8), separator_height=0)
+        # بطاقات الملفات تتابع حالة الصلاحية (قبول الطلب مثلاً) طالما النافذة مفتوحة
+        popup.bind(on_dismiss=lambda *x: self._release_pdf_cards())
         content.add_widget(Button(text=ar('إغلاق'), size_hint_y=None, height=dp(44), on_release=lambda x: popup.dismiss()))
         popup.open()
 
+    def _release_pdf_cards(self):
+        self._pdf_pool.release_all(self._pdf_cards.values())
+        self._pdf_cards.clear()
+
     def build_settings(self):
         layout = self.content
         layout.add_widget(Label(text=ar('إعدادات حسابي'), font_size=dp(20), bold=True, font_name=self.app.font_name, halign='right', size_hint_y=None, height=dp(50)))
@@ -218,5 +425,5 @@ class HomeScreen(Screen):
     def logout(self, *a):
         from utils.firebase_manager import FirebaseManager
         FirebaseManager.remove_session(self.app.user_code)
-        self.app.user_code = ''; self.app.username = ''
+        self.app.user_role = 'guest'; self.app.user_code = ''; self.app.username = ''
         self.manager.current = 'login'
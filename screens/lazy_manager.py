@@ -0,0 +1,53 @@
+# screens/lazy_manager.py - مدير شاشات يبني كل شاشة عند أول انتقال إليها بدلاً من بنائها كلها عند التشغيل
+import importlib
+from collections import OrderedDict
+from kivy.clock import Clock
+from kivy.uix.screenmanager import ScreenManager
+
+
+class LazyScreenManager(ScreenManager):
+    """ الشاشات تُسجّل كمصانع (وحدة + اسم الصنف) ولا تُستورد أو تُبنى إلا عند طلبها:
+        current = 'admin' أو get_screen('admin'). prebuild يبني شاشة متوقعة في وقت الفراغ. """
+
+    PREBUILD_DELAY = 1.0   # ثوانٍ بعد ظهور الشاشة الحالية
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._factories = OrderedDict()   # name -> (module, class_name)
+        self._prebuild = []
+        self._prebuild_event = None
+
+    def register(self, name, module, class_name):
+        self._factories[name] = (module, class_name)
+
+    def is_built(self, name):
+        return any(s.name == name for s in self.screens)
+
+    def has_screen(self, name):
+        return name in self._factories or self.is_built(name)
+
+    def get_screen(self, name):
+        if not self.is_built(name) and name in self._factories:
+            self._build(name)
+        return super().get_screen(name)
+
+    def _build(self, name):
+        module, class_name = self._factories[name]
+        cls = getattr(importlib.import_module(module), class_name)
+        self.add_widget(cls(name=name))
+
+    def prebuild(self, *names):
+        """ بناء الشاشات المتوقعة لاحقاً، شاشة واحدة في كل استدعاء حتى لا يتجمد الإطار """
+        self._prebuild = [n for n in names if n in self._factories and not self.is_built(n)]
+        if self._prebuild_event: self._prebuild_event.cancel()
+        if self._prebuild:
+            self._prebuild_event = Clock.schedule_once(self._prebuild_next, self.PREBUILD_DELAY)
+
+    def _prebuild_next(self, dt):
+        while self._prebuild:
+            name = self._prebuild.pop(0)
+            if not self.is_built(name):
+                self._build(name)
+                break
+        if self._prebuild:
+            self._prebuild_event = Clock.schedule_once(self._prebuild_next, self.PREBUILD_DELAY)
@@ -16,6 +16,7 @@ class LoginScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.app = App.get_running_app()
+        self._login_seq = 0
         self.setup_ui()
 
     def setup_ui(self):
@@ -132,6 +133,7 @@ class LoginScreen(Screen):
         )
         login_btn.bind(on_release=self.login)
         card.add_widget(login_btn)
+        self.login_btn = login_btn
 
         # ─── فاصل ───
         card.add_widget(Label(
@@ -180,21 +182,27 @@ class LoginScreen(Screen):
             return
 
         # ─── طالب ───
-        try:
-            students = FirebaseManager.get_students()
-        except Exception:
-            self.error_label.text = ar('لا يوجد اتصال بالبيانات')
-            return
-
-        if user in students and students[user].get('password') == pw:
+        # طلب صغير لسجل هذا الكود فقط بدلاً من انتظار مزامنة كل الطلاب
+        self.error_label.text = ar('جاري التحقق...')
+        self.login_btn.disabled = True
+        self._login_seq += 1
+        seq = self._login_seq
+        FirebaseManager.lookup_student(user, lambda record, source: self._on_student_lookup(seq, user, pw, record, source))
+
+    def _on_student_lookup(self, seq, user, pw, record, source):
+        if seq != self._login_seq: return   # محاولة أحدث بدأت بعد هذه
+        self.login_btn.disabled = False
+        if record and record.get('password') == pw:
             self.app.user_role = 'student'
             self.app.user_code = user
-            self.app.username  = students[user].get('name', user)
+            self.app.username  = record.get('name', user)
             # ── تسجيل الجلسة ──
             FirebaseManager.set_session(user, self.app.username)
             self.error_label.text = ''
             self.username.text = ''
             self.password.text = ''
             self.manager.current = 'home'
+        elif record is None and source == 'snapshot':
+            self.error_label.text = ar('لا يوجد اتصال بالبيانات')
         else:
             self.error_label.text = ar('بيانات الدخول غير صحيحة!')
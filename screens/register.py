@@ -108,6 +108,7 @@ class RegisterScreen(Screen):
         )
         send_btn.bind(on_release=self.submit_request)
         content.add_widget(send_btn)
+        self.send_btn = send_btn
 
         # ─── زر العودة ───
         back_btn = Button(
@@ -179,7 +180,15 @@ class RegisterScreen(Screen):
             return
 
         self._show_msg('⏳ جارٍ إرسال الطلب...', error=False)
-
+        self.send_btn.disabled = True
+        # الزائر لا يحمّل قائمة الطلاب، فالتحقق من الكود يتم بطلب لسجله فقط
+        FirebaseManager.lookup_student(code, lambda record, source: self._on_code_checked(code, name, pw, record))
+
+    def _on_code_checked(self, code, name, pw, record):
+        self.send_btn.disabled = False
+        if record is not None:
+            self._show_msg('❌ موجود مسبقاً', error=True)
+            return
         ok, msg = FirebaseManager.submit_registration_request(code, name, pw)
         if ok:
             self._show_msg(f'✅ {msg}', error=False)
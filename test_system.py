@@ -1,12 +1,36 @@
 # test_system.py - نسخة معدلة لتناسب منطق طلبات الـ PDF
+# التشغيل: python test_system.py          (سيرفر Firebase محلي - لا يلمس بيانات الإنتاج)
+#          python test_system.py --live   (قاعدة البيانات الحقيقية)
 import sys
 import os
+import time
 
 sys.path.insert(0, os.path.abspath('.'))
+from kivy.clock import Clock
 from utils.firebase_manager import FirebaseManager
+from utils.firebase_backend import RestBackend
+from utils.local_firebase_server import LocalFirebaseServer
 
-def run_test():
-    print("--- Starting MyStudent System Test (Local Mode) ---")
+def wait_for_server(timeout=5):
+    """ تشغيل حلقة Kivy حتى يؤكد السيرفر كل الكتابات المعلقة """
+    FirebaseManager.flush_writes()
+    end = time.time() + timeout
+    while time.time() < end:
+        Clock.tick()
+        if not len(FirebaseManager._get_journal()): return True
+        time.sleep(0.01)
+    return False
+
+def spin(seconds, until=lambda: False):
+    """ تشغيل حلقة Kivy حتى يتحقق الشرط أو تنتهي المهلة """
+    end = time.time() + seconds
+    while time.time() < end and not until():
+        Clock.tick()
+        time.sleep(0.01)
+    return until()
+
+def run_test(server=None):
+    print(f"--- Starting MyStudent System Test ({'Local Server' if server else 'Live'} Mode) ---")
     
     test_student_code = "TEST_999"
     test_student_name = "Test Student"
@@ -72,12 +96,545 @@ def run_test():
     else:
         print("   FAIL: Access still not granted.")
 
-    # 6. Cleanup
+    # 6. Server state
+    print("\n5. Testing Server Sync:")
+    synced = wait_for_server()
+    print(f"   Writes confirmed: {'PASS' if synced else 'FAIL'}")
+    if server:
+        remote = server.get()
+        ok = test_student_code in remote.get('students', {}) and test_student_code not in remote.get('pending_requests', {})
+        print(f"   Student on server: {'PASS' if ok else 'FAIL'}")
+        ok = test_student_code in remote.get('pdfs', {}).get(test_pdf_id, {}).get('approved_students', {})
+        print(f"   PDF access on server: {'PASS' if ok else 'FAIL'}")
+        print(f"   Requests sent: {len(server.requests)}")
+
+    # 7. Cleanup
     print("\n--- Cleaning up ---")
     FirebaseManager.delete_student(test_student_code)
     FirebaseManager.delete_pdf(test_pdf_id)
+    wait_for_server()
     print("   Test data cleared.")
     print("\nSYSTEM TEST COMPLETED SUCCESSFULLY!")
 
+def run_journal_test(server):
+    print("\n--- Write Journal (offline / restart / rejection) ---")
+    import tempfile
+    from utils.write_journal import WriteJournal
+    path = os.path.join(tempfile.mkdtemp(), 'write_journal.log')
+    FirebaseManager._journal = WriteJournal(path)
+    results = {}
+
+    # 1. بدون اتصال: العملية تبقى في السجل حتى إعادة الإرسال
+    server.fail_next(4)
+    FirebaseManager.submit_registration_request("J1", "Journal One", "pass1", on_done=lambda ok: results.update(j1=ok))
+    FirebaseManager.flush_writes()
+    spin(10, lambda: 'j1' in results)
+    ok = results.get('j1') is False and len(FirebaseManager._get_journal()) == 1 and not server.get('pending_requests/J1')
+    print(f"   Offline write kept in journal: {'PASS' if ok else 'FAIL'}")
+    FirebaseManager.replay_journal()
+    spin(5, lambda: not len(FirebaseManager._get_journal()))
+    ok = bool(server.get('pending_requests/J1')) and not len(FirebaseManager._get_journal())
+    print(f"   Offline replay: {'PASS' if ok else 'FAIL'}")
+
+    # 2. إعادة التشغيل: السجل يُقرأ من الملف ويُرسل
+    WriteJournal(path).append({"pending_requests/J2": {"name": "Journal Two", "password": "pass2"}})
+    FirebaseManager._journal = WriteJournal(path)
+    loaded = len(FirebaseManager._get_journal())
+    FirebaseManager.replay_journal()
+    spin(5, lambda: not len(FirebaseManager._get_journal()))
+    ok = loaded == 1 and bool(server.get('pending_requests/J2'))
+    print(f"   Restart reload and replay: {'PASS' if ok else 'FAIL'}")
+
+    # 3. الضغط: بعد COMPACT_AFTER سطراً ميتاً يبقى في الملف المعلق فقط
+    journal = WriteJournal(os.path.join(os.path.dirname(path), 'compact.log'))
+    journal.COMPACT_AFTER = 4
+    keys = [journal.append({f"x/{i}": i}) for i in range(5)]
+    journal.ack(keys[:1]); journal.ack(keys[1:2])
+    with open(journal.path, encoding='utf-8') as f: lines = f.readlines()
+    ok = len(lines) == 3 and [k for k, _ in WriteJournal(journal.path).pending()] == keys[2:]
+    journal.ack(keys[2:])
+    ok = ok and os.path.getsize(journal.path) == 0
+    print(f"   Journal compaction: {'PASS' if ok else 'FAIL'}")
+
+    # 4. رفض نهائي (401): لا يُعاد للأبد، لا يوقف باقي الكتابات، ويُلغى أثره المحلي
+    server.deny_writes('admin_settings')
+    before = FirebaseManager.get_admin_settings()
+    FirebaseManager.save_admin_settings({'center_name': 'Denied'}, on_done=lambda ok: results.update(denied=ok))
+    FirebaseManager.submit_registration_request("J3", "Journal Three", "pass3", on_done=lambda ok: results.update(j3=ok))
+    FirebaseManager.flush_writes()
+    spin(5, lambda: 'denied' in results and 'j3' in results and not len(FirebaseManager._get_journal()))
+    spin(1, lambda: FirebaseManager.get_admin_settings() == before)
+    ok = results.get('denied') is False and results.get('j3') is True and bool(server.get('pending_requests/J3'))
+    print(f"   Rejected write does not block others: {'PASS' if ok else 'FAIL'}")
+    ok = not len(FirebaseManager._get_journal()) and FirebaseManager.get_admin_settings() == before
+    print(f"   Rejected write dropped and rolled back: {'PASS' if ok else 'FAIL'}")
+
+    for code in ("J1", "J2", "J3"): FirebaseManager.reject_request(code)
+    wait_for_server()
+
+def run_stream_test(server):
+    print("\n--- Realtime Sync (SSE put/patch) ---")
+    from utils.firebase_stream import iter_events
+    lines = [b"event: put\n", b'data: {"path": "/", "data": {"a": 1}}\n', b"\n",
+             b": comment\n", b"event: keep-alive\n", b"data: null\n", b"\n",
+             b"event: patch\n", b'data: {"path": "/x",\n', b'data: "data": {"b": 2}}\n', b"\n"]
+    ok = list(iter_events(lines)) == [('put', {'path': '/', 'data': {'a': 1}}), ('keep-alive', None),
+                                      ('patch', {'path': '/x', 'data': {'b': 2}})]
+    print(f"   SSE parsing: {'PASS' if ok else 'FAIL'}")
+
+    ready, events = [], []
+    FirebaseManager.start_realtime_sync(on_finish=lambda: ready.append(True),
+                                        on_change=lambda event, path: events.append((event, path)))
+    ok = spin(5, lambda: ready)
+    print(f"   Initial snapshot: {'PASS' if ok else 'FAIL'}")
+
+    # put لسجل واحد ثم patch لعدة مسارات في نفس التغيير
+    server._commit([("subjects/sse_1", {"name": "Stream", "doctor": "A"})])
+    ok = spin(5, lambda: FirebaseManager.get_subjects().get("sse_1", {}).get("name") == "Stream")
+    print(f"   Stream put applied: {'PASS' if ok else 'FAIL'}")
+    server._commit([("subjects/sse_1/doctor", "B"), ("subjects/sse_2", {"name": "Second", "doctor": "C"})])
+    ok = spin(5, lambda: FirebaseManager.get_subjects().get("sse_1", {}).get("doctor") == "B"
+                         and "sse_2" in FirebaseManager.get_subjects())
+    ok = ok and ('patch', '') in events and FirebaseManager.get_subjects()["sse_1"]["name"] == "Stream"
+    print(f"   Stream patch applied: {'PASS' if ok else 'FAIL'}")
+
+    server._commit([("subjects/sse_1", None), ("subjects/sse_2", None)])
+    ok = spin(5, lambda: not {"sse_1", "sse_2"} & set(FirebaseManager.get_subjects()))
+    print(f"   Stream delete applied: {'PASS' if ok else 'FAIL'}")
+    FirebaseManager.stop_realtime_sync()
+
+def run_etag_test(server):
+    print("\n--- Conditional GET (ETag / 304) ---")
+    server._commit([("subjects/etag_1", {"name": "ETag", "doctor": "A"})])
+    results = []
+    sent = len(server.requests)
+    # طلبان متطابقان أثناء التنفيذ: طلب واحد للسيرفر ونفس النتيجة للاثنين
+    FirebaseManager._call_api("subjects/etag_1", "GET", on_success=results.append)
+    FirebaseManager._call_api("subjects/etag_1", "GET", on_success=results.append)
+    spin(5, lambda: len(results) == 2)
+    ok = len(results) == 2 and results[0] is results[1] and len(server.requests) - sent == 1
+    print(f"   In-flight GETs deduplicated: {'PASS' if ok else 'FAIL'}")
+
+    # بدون تغيير: 304 ويعاد نفس الكائن المحفوظ بدلاً من قراءة البيانات من جديد
+    FirebaseManager._call_api("subjects/etag_1", "GET", on_success=results.append)
+    spin(5, lambda: len(results) == 3)
+    ok = len(results) == 3 and results[2] is results[0]
+    print(f"   Unchanged GET answered from cache (304): {'PASS' if ok else 'FAIL'}")
+
+    statuses = []
+    tag = FirebaseManager._etags[("subjects/etag_1", ())][0]
+    FirebaseManager._get_backend().request("GET", "subjects/etag_1", headers={'If-None-Match': tag},
+                                           on_response=lambda status, result, etag: statuses.append(status))
+    spin(5, lambda: statuses)
+    print(f"   Server returns 304 for matching ETag: {'PASS' if statuses == [304] else 'FAIL'}")
+
+    server._commit([("subjects/etag_1/doctor", "B")])
+    FirebaseManager._call_api("subjects/etag_1", "GET", on_success=results.append)
+    spin(5, lambda: len(results) == 4)
+    ok = len(results) == 4 and results[3] == {"name": "ETag", "doctor": "B"}
+    print(f"   Changed GET returns new data: {'PASS' if ok else 'FAIL'}")
+
+    # if-match بقيمة قديمة يُرفض بـ 412 مع القيمة والـ ETag الحاليين
+    FirebaseManager._get_backend().request("PUT", "subjects/etag_1", data={"name": "Stale"}, headers={'if-match': tag},
+                                           on_response=lambda status, result, etag: statuses.append((status, result)))
+    spin(5, lambda: len(statuses) == 2)
+    ok = statuses[1:] == [(412, {"name": "ETag", "doctor": "B"})] and server.get("subjects/etag_1/name") == "ETag"
+    print(f"   Stale if-match rejected (412): {'PASS' if ok else 'FAIL'}")
+    server._commit([("subjects/etag_1", None)])
+
+def run_transport_test(server):
+    print("\n--- Transport (retry / backoff / circuit breaker) ---")
+    from utils.http_pool import HttpPool
+    from utils.retry_policy import RetryPolicy, CircuitBreaker
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=0.15, deadline=5)
+    now = time.monotonic()
+    delays = [policy.next_delay(0, now, 503) for _ in range(50)] + [policy.next_delay(1, now, None) for _ in range(50)]
+    ok = all(0 <= d <= 0.15 for d in delays) and max(delays[:50]) <= 0.1
+    ok = ok and policy.next_delay(2, now, 503) is None and policy.next_delay(0, now, 400) is None
+    ok = ok and policy.next_delay(0, now - 10, 503) is None
+    print(f"   Backoff bounded by attempts and deadline: {'PASS' if ok else 'FAIL'}")
+    ok = policy.is_permanent(401) and policy.is_permanent(400) and not policy.is_permanent(429) \
+        and not policy.is_permanent(408) and not policy.is_permanent(503) and not policy.is_permanent(None)
+    print(f"   Permanent errors classified: {'PASS' if ok else 'FAIL'}")
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    breaker.record_failure(); breaker.record_failure()
+    ok = breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    time.sleep(0.15)
+    ok = ok and breaker.allow() and not breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    ok = ok and breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.15)
+    ok = ok and breaker.allow()
+    breaker.record_success()
+    ok = ok and breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    print(f"   Circuit breaker states: {'PASS' if ok else 'FAIL'}")
+
+    # 503 مرتين ثم نجاح: الطلب يكتمل بعد محاولتين معادتين
+    pool = HttpPool(server.url, size=1, policy=RetryPolicy(max_attempts=3, base_delay=0.05))
+    results = []
+    server.fail_next(2)
+    pool.request("GET", "admin_settings", on_success=lambda res: results.append('ok'), on_failure=results.append)
+    spin(5, lambda: results)
+    m = pool.metrics.snapshot()
+    ok = results == ['ok'] and m['retries'] == 2 and m['server_errors'] == 2 and m['successes'] == 1
+    print(f"   Retried until success: {'PASS' if ok else 'FAIL'}")
+    server.fail_next(3)
+    pool.request("GET", "admin_settings", on_success=lambda res: results.append('ok'), on_failure=results.append)
+    spin(5, lambda: len(results) == 2)
+    ok = len(results) == 2 and str(results[1]).startswith('HTTP 503')
+    print(f"   Gives up after max attempts: {'PASS' if ok else 'FAIL'}")
+    pool.stop()
+
+    # مسار بأحرف غير ASCII (كود عربي): يُرمّز في الرابط والخيط يبقى يعمل للطلبات التالية
+    pool = HttpPool(server.url, size=1)
+    server._commit([("students/١٢٣", {"name": "Arabic Code"})])
+    results = []
+    pool.request("GET", "students/١٢٣", on_success=results.append, on_failure=results.append)
+    pool.request("GET", "students/١٢٣/name", on_success=results.append, on_failure=results.append)
+    spin(5, lambda: len(results) == 2)
+    ok = results == [{"name": "Arabic Code"}, "Arabic Code"]
+    print(f"   Non-ASCII path quoted: {'PASS' if ok else 'FAIL'}")
+    pool.request("GET", "students/\ud800", on_success=results.append, on_failure=lambda err: results.append('failed'))
+    pool.request("GET", "students", headers={'X-Note': 'ملاحظة'}, on_success=results.append,
+                 on_failure=lambda err: results.append('failed'))
+    pool.request("GET", "students/١٢٣/name", on_success=results.append, on_failure=results.append)
+    spin(5, lambda: len(results) == 5)
+    print(f"   Unexpected error fails one request only: {'PASS' if results[2:] == ['failed', 'failed', 'Arabic Code'] else 'FAIL'}")
+    server._commit([("students/١٢٣", None)])
+    pool.stop()
+
+    # بعد فشلين يفتح القاطع: الطلبات التالية تُرفض بدون الوصول للسيرفر ولا تدخل في متوسط الزمن
+    pool = HttpPool(server.url, size=1, policy=RetryPolicy(max_attempts=1),
+                    breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    errors = []
+    server.fail_next(2)
+    for _ in range(2):
+        pool.request("GET", "admin_settings", on_failure=errors.append)
+        spin(5, lambda n=len(errors): len(errors) > n)
+    sent = len(server.requests)
+    for _ in range(3):
+        pool.request("GET", "admin_settings", on_failure=errors.append)
+    spin(5, lambda: len(errors) == 5)
+    m = pool.metrics.snapshot()
+    ok = len(server.requests) == sent and all(e.startswith('Circuit open') for e in errors[2:]) and len(errors) == 5
+    print(f"   Open circuit rejects locally: {'PASS' if ok else 'FAIL'}")
+    ok = m['circuit_rejected'] == 3 and m['failures'] == 2 and pool.metrics.latency_count == 2 \
+        and m['avg_latency_ms'] == round(pool.metrics.latency_total * 1000 / 2, 1)
+    print(f"   Latency averaged over sent requests only: {'PASS' if ok else 'FAIL'}")
+    pool.stop()
+
+def run_transaction_test(server):
+    print("\n--- Transactions (412 retry / attempt limit / offline rollback) ---")
+    saved_scope, saved_db = FirebaseManager._scope, FirebaseManager._cached_db
+    FirebaseManager._scope = ('',)
+    server._commit([("subjects/TX1", {"name": "Transactions", "pdfs": ["P0"]})])
+    FirebaseManager._reconcile('subjects/TX1', server.get('subjects/TX1'))
+    path, results = "subjects/TX1/pdfs", []
+
+    def add(pdf_id, conflict=None):
+        # نفس دمج add_pdf_to_subject، مع كتابة مدير آخر على السيرفر بين قراءة الـ ETag والكتابة
+        calls = []
+        def update(current):
+            calls.append(current)
+            if conflict and len(calls) > 1:
+                conflict(current)
+            pdfs = list(current or [])
+            if pdf_id not in pdfs: pdfs.append(pdf_id)
+            return pdfs
+        return update
+
+    # 1. مدير آخر يضيف P2 أثناء إضافة P1: يرد السيرفر 412 فنعيد الدمج ويبقى الملفان
+    raced = []
+    def other_admin(current):
+        if not raced:
+            raced.append(True)
+            server._commit([(path, list(current or []) + ["P2"])])
+    FirebaseManager.transaction(path, add("P1", other_admin), lambda ok, value: results.append((ok, value)))
+    spin(5, lambda: results)
+    puts = [r for r in server.requests if r[0] == 'PUT' and 'TX1' in r[1]]
+    ok = results == [(True, ["P0", "P2", "P1"])] and server.get(path) == ["P0", "P2", "P1"] and len(puts) == 2
+    ok = ok and FirebaseManager._cached_db['subjects']['TX1']['pdfs'] == ["P0", "P2", "P1"]
+    print(f"   Concurrent add retried after 412: {'PASS' if ok else 'FAIL'}")
+
+    # 2. تعارض في كل محاولة: نتوقف بعد max_attempts ونرجع لآخر قيمة من السيرفر
+    results.clear()
+    sent = len(server.requests)
+    def always(current):
+        server._commit([(path, list(current or []) + [f"X{len(server.requests)}"])])
+    FirebaseManager.transaction(path, add("P3", always), lambda ok, value: results.append((ok, value)), max_attempts=2)
+    spin(5, lambda: results)
+    puts = [r for r in server.requests[sent:] if r[0] == 'PUT']
+    ok = results == [(False, "HTTP 412")] and len(puts) == 2 and "P3" not in server.get(path)
+    cached = FirebaseManager._cached_db['subjects']['TX1']['pdfs']
+    ok = ok and cached == server.get(path)[:-1]   # آخر قيمة رآها قبل تعارض المحاولة الأخيرة
+    print(f"   Stops after max attempts: {'PASS' if ok else 'FAIL'}")
+
+    # 3. بدون اتصال: الإضافة تظهر فوراً ثم تُلغى عند الفشل
+    results.clear()
+    before = FirebaseManager._cached_db['subjects']['TX1']['pdfs']
+    server.fail_next(4)
+    FirebaseManager.add_pdf_to_subject("TX1", "P4", lambda ok: results.append(ok))
+    optimistic = "P4" in FirebaseManager._cached_db['subjects']['TX1']['pdfs']
+    spin(15, lambda: results)
+    server._fail_next = 0
+    ok = optimistic and results == [False] and FirebaseManager._cached_db['subjects']['TX1']['pdfs'] == before
+    ok = ok and "P4" not in server.get(path)
+    print(f"   Offline failure rolls back: {'PASS' if ok else 'FAIL'}")
+    results.clear()
+    FirebaseManager.add_pdf_to_subject("TX1", "P4", lambda ok: results.append(ok))
+    spin(5, lambda: results)
+    print(f"   Same add succeeds when back online: {'PASS' if results == [True] and 'P4' in server.get(path) else 'FAIL'}")
+
+    server._commit([("subjects/TX1", None)])
+    FirebaseManager._scope, FirebaseManager._cached_db = saved_scope, saved_db
+
+def run_migration_test(server):
+    print("\n--- Schema Migrations (legacy lists -> keyed maps) ---")
+    saved_scope, saved_db = FirebaseManager._scope, FirebaseManager._cached_db
+    saved_anns = server.get('announcements')
+    FirebaseManager._scope = ('',)
+    # "1" يتصادم مع موضع المصفوفة 1 فيجب ألا يُحذف مع المواضع القديمة
+    server._commit([("pdfs/MG1", {"title": "Legacy", "approved_students": ["2023001", "1"],
+                                  "pending_download_requests": ["2023002"]})])
+    FirebaseManager._reconcile('pdfs/MG1', server.get('pdfs/MG1'))
+    count = FirebaseManager.migrate_pdf_access_schema()
+    wait_for_server()
+    pdf = server.get('pdfs/MG1')
+    ok = count > 0 and pdf['approved_students'] == {"2023001": True, "1": True}
+    ok = ok and pdf['pending_download_requests'] == {"2023002": True}
+    ok = ok and all(FirebaseManager.has_pdf_access("MG1", code) for code in ("2023001", "1"))
+    ok = ok and FirebaseManager.is_pdf_access_pending("MG1", "2023002") and not FirebaseManager.has_pdf_access("MG1", "0")
+    print(f"   PDF access list migrated (with index-like code): {'PASS' if ok else 'FAIL'}")
+
+    # مدير ثانٍ بعد لقطة مؤكدة: الحقول خرائط بالفعل فلا يكتب شيئاً
+    FirebaseManager._reconcile('pdfs/MG1', server.get('pdfs/MG1'))
+    sent = len(server.requests)
+    count = FirebaseManager.migrate_pdf_access_schema()
+    wait_for_server()
+    ok = count == 0 and len(server.requests) == sent and server.get('pdfs/MG1') == pdf
+    print(f"   PDF migration on migrated data is a no-op: {'PASS' if ok else 'FAIL'}")
+
+    legacy = [{"id": "ann_1700000000000", "text": "Old", "time": "2023-11-14 22:13"},
+              {"text": "Older", "time": "2023-11-01 10:00"}]
+    server._commit([("announcements", legacy)])
+    FirebaseManager._reconcile('announcements', server.get('announcements'))
+    results = []
+    FirebaseManager.migrate_announcements_schema(lambda ok: results.append(ok))
+    spin(5, lambda: results)
+    anns = server.get('announcements')
+    ok = results == [True] and isinstance(anns, dict) and sorted(a['text'] for a in anns.values()) == ["Old", "Older"]
+    ok = ok and all(key.startswith('ann_') and a['id'] == key for key, a in anns.items())
+    ok = ok and [a['text'] for a in FirebaseManager.get_announcements()] == ["Old", "Older"]
+    print(f"   Announcements list migrated: {'PASS' if ok else 'FAIL'}")
+
+    # مدير ثانٍ ما زالت نسخته المحلية بالشكل القديم: السيرفر محوّل بالفعل فلا يستبدله
+    FirebaseManager._apply_delta('put', 'announcements', legacy)
+    results.clear()
+    sent = len(server.requests)
+    FirebaseManager.migrate_announcements_schema(lambda ok: results.append(ok))
+    spin(5, lambda: results)
+    writes = [r for r in server.requests[sent:] if r[0] != 'GET']
+    ok = results == [True] and not writes and server.get('announcements') == anns
+    ok = ok and FirebaseManager._cached_db.get('announcements') == anns
+    print(f"   Concurrent announcements migration is a no-op: {'PASS' if ok else 'FAIL'}")
+
+    # صفحة فشل تحميلها تُبلغ كفشل لا كصفحة فارغة (وإلا تتوقف الشاشة عن طلب الأقدم)
+    pages, errors = [], []
+    server.fail_next(4)
+    FirebaseManager.fetch_announcements(1, on_done=pages.append, on_failure=errors.append)
+    spin(15, lambda: pages or errors)
+    FirebaseManager.fetch_announcements(1, on_done=pages.append, on_failure=errors.append)
+    spin(5, lambda: pages)
+    ok = len(errors) == 1 and len(pages) == 1 and pages[0] and pages[0][0]['text'] == "Old"
+    print(f"   Failed page fetch is not an empty page: {'PASS' if ok else 'FAIL'}")
+
+    server._commit([("pdfs/MG1", None), ("announcements", saved_anns)])
+    FirebaseManager._scope, FirebaseManager._cached_db = saved_scope, saved_db
+
+def run_async_test(server):
+    print("\n--- Async API (await / gather) ---")
+    import asyncio
+    from utils.firebase_async import AsyncFirebaseManager, FirebaseError
+    saved_scope, saved_db = FirebaseManager._scope, FirebaseManager._cached_db
+    FirebaseManager._scope = ('',)
+    server._commit([("pending_requests/AS1", {"name": "Async One", "password": "pass1"}),
+                    ("pending_requests/AS2", {"name": "Async Two", "password": "pass2"}),
+                    ("pdfs/ASP", {"title": "Async PDF", "pending_download_requests": {"AS1": True}})])
+    FirebaseManager._reconcile('', server.get())
+
+    async def main():
+        async def pump():
+            # في التطبيق تدور ساعة Kivy على نفس الحلقة (App.async_run)
+            while True:
+                Clock.tick()
+                await asyncio.sleep(0.01)
+        ticker = asyncio.ensure_future(pump())
+        try:
+            # عمليتان مستقلتان تُرسلان معاً وتُنتظران معاً
+            sent = len(server.requests)
+            results = await asyncio.wait_for(AsyncFirebaseManager.gather(
+                AsyncFirebaseManager.approve_requests(["AS1", "AS2"]),
+                AsyncFirebaseManager.resolve_pdf_requests([("ASP", "AS1")])), 10)
+            patches = [r for r in server.requests[sent:] if r[0] == 'PATCH']
+            ok = results == [2, 1] and {"AS1", "AS2"} <= set(server.get('students') or {})
+            ok = ok and server.get('pdfs/ASP/approved_students') == {"AS1": True} and len(patches) == 1
+            print(f"   Gathered writes confirmed together: {'PASS' if ok else 'FAIL'}")
+
+            value = await asyncio.wait_for(AsyncFirebaseManager.get("students/AS1/name"), 5)
+            pair = await asyncio.wait_for(AsyncFirebaseManager.get_many(["students/AS1/name", "students/AS2/name"]), 5)
+            ok = value == "Async One" and pair == {"students/AS1/name": "Async One", "students/AS2/name": "Async Two"}
+            print(f"   Awaitable reads: {'PASS' if ok else 'FAIL'}")
+
+            # لا يوجد ما يُكتب: النتيجة فوراً بدون انتظار السيرفر
+            sent = len(server.requests)
+            ok = await asyncio.wait_for(AsyncFirebaseManager.delete_student("NOPE"), 1) is False
+            ok = ok and await asyncio.wait_for(AsyncFirebaseManager.approve_requests([]), 1) == 0
+            print(f"   No-op resolves immediately: {'PASS' if ok and len(server.requests) == sent else 'FAIL'}")
+
+            # كتابة يرفضها السيرفر: الخطأ يصل لمن ينتظرها فقط
+            server.deny_writes('subjects/ASDENY')
+            results = await asyncio.wait_for(AsyncFirebaseManager.gather(
+                AsyncFirebaseManager.save_subject("ASDENY", "Denied", "Dr"),
+                AsyncFirebaseManager.save_subject("ASOK", "Allowed", "Dr")), 10)
+            ok = isinstance(results[0], FirebaseError) and results[1] is True and server.get('subjects/ASOK/name') == "Allowed"
+            print(f"   Rejected write raises for its own caller: {'PASS' if ok else 'FAIL'}")
+
+            pdfs = await asyncio.wait_for(AsyncFirebaseManager.transaction(
+                "subjects/ASOK/pdfs", lambda current: list(current or []) + ["P1"]), 5)
+            print(f"   Awaitable transaction: {'PASS' if pdfs == ['P1'] and server.get('subjects/ASOK/pdfs') == ['P1'] else 'FAIL'}")
+        finally:
+            ticker.cancel()
+
+    asyncio.run(main())
+    server._commit([("students/AS1", None), ("students/AS2", None), ("pdfs/ASP", None), ("subjects/ASOK", None)])
+    FirebaseManager._scope, FirebaseManager._cached_db = saved_scope, saved_db
+
+def run_scope_test(server):
+    print("\n--- Sync Scope (startup / login / logout / restart) ---")
+    import tempfile
+    from utils import local_store
+    folder, snapshot_path = tempfile.mkdtemp(), local_store.snapshot_path
+    local_store.snapshot_path = lambda: os.path.join(folder, local_store.SNAPSHOT_NAME)
+    server._commit([("students/S1", {"name": "Scope One", "password": "pass1", "materials": []}),
+                    ("students/S2", {"name": "Scope Two", "password": "pass2", "materials": []})])
+    saved_scope, saved_db = FirebaseManager._scope, FirebaseManager._cached_db
+
+    def restart():
+        # نفس ترتيب MainApp.build: النسخة المحفوظة ثم نطاق الزائر
+        FirebaseManager._scope, FirebaseManager._device_students = None, None
+        FirebaseManager.load_snapshot()
+        FirebaseManager.set_sync_scope('guest')
+
+    # أول تشغيل بعد جلسة أدمن: النسخة المحفوظة فيها كل الطلاب
+    local_store.save_snapshot({'students': server.get('students'), 'subjects': {}})
+    restart()
+    ok = not FirebaseManager.get_students() and not local_store.load_snapshot().get('students')
+    print(f"   Startup drops full student list: {'PASS' if ok else 'FAIL'}")
+
+    FirebaseManager.set_sync_scope('student', 'S1')
+    FirebaseManager._reconcile('students/S1', server.get('students/S1'))   # ما يجلبه البث بعد الدخول
+    FirebaseManager.set_sync_scope('guest')
+    ok = list(FirebaseManager.get_students()) == ['S1'] and list(local_store.load_snapshot().get('students', {})) == ['S1']
+    print(f"   Logout keeps this device's student: {'PASS' if ok else 'FAIL'}")
+
+    restart()
+    found = []
+    server.fail_next(4)
+    FirebaseManager.lookup_student('S1', lambda record, source: found.append((record, source)))
+    spin(10, lambda: found)
+    ok = found and found[0][1] == 'snapshot' and (found[0][0] or {}).get('password') == 'pass1'
+    ok = ok and 'S2' not in FirebaseManager.get_students()
+    print(f"   Offline login after restart: {'PASS' if ok else 'FAIL'}")
+
+    # تسجيل بكود موجود: الزائر يتحقق بسجل الكود، والأدمن لا يقبل طلباً يستبدل طالباً موجوداً
+    found.clear()
+    FirebaseManager.lookup_student('S2', lambda record, source: found.append(record))
+    spin(5, lambda: found)
+    print(f"   Registration check finds existing code: {'PASS' if found and found[0] else 'FAIL'}")
+    FirebaseManager._scope = ('',)
+    FirebaseManager._reconcile('', server.get())
+    server._commit([("pending_requests/S2", {"name": "Impostor", "password": "hacked"})])
+    FirebaseManager._reconcile('pending_requests', server.get('pending_requests'))
+    approved = FirebaseManager.approve_requests(['S2'])
+    wait_for_server()
+    ok = approved == 0 and server.get('students/S2/password') == 'pass2' and server.get('pending_requests/S2')
+    print(f"   Approval skips existing student: {'PASS' if ok else 'FAIL'}")
+    FirebaseManager.reject_requests(['S2'])
+    wait_for_server()
+
+    # تغيير كلمة المرور يُبطل السجل المجلوب للدخول فلا تعود القديمة من الذاكرة
+    found.clear()
+    FirebaseManager.lookup_student('S2', lambda record, source: found.append(record))
+    spin(5, lambda: found)
+    done = []
+    FirebaseManager.change_password('S2', 'pass2b', lambda ok: done.append(ok))
+    spin(5, lambda: done)
+    found.clear()
+    FirebaseManager.lookup_student('S2', lambda record, source: found.append(record))
+    spin(5, lambda: found)
+    ok = done == [True] and found and (found[0] or {}).get('password') == 'pass2b'
+    print(f"   Password change invalidates login lookup: {'PASS' if ok else 'FAIL'}")
+
+    server._commit([("students/S1", None), ("students/S2", None)])
+    FirebaseManager._scope, FirebaseManager._cached_db, FirebaseManager._device_students = saved_scope, saved_db, None
+    local_store.snapshot_path = snapshot_path
+
+def run_import_test():
+    print("\n--- Student CSV Import ---")
+    from utils.student_import import StudentImporter
+    lines = ["الاسم,الكود,كلمة المرور\n",
+             "Ali,S1,pass1\n",
+             "Mona,S2,pass2\n",
+             "Dup,S1,pass3\n",          # مكرر داخل الملف
+             "Old,OLD1,pass4\n",        # طالب موجود
+             "Wait,P1,pass5\n",         # طلب معلق
+             "Short,S3,12\n",           # كلمة مرور قصيرة
+             "Bad,S.4,pass6\n",         # كود غير صالح
+             ",S5,pass7\n",             # حقل ناقص
+             "\n"]
+    lines += [f"Student {i},B{i},pass{i}\n" for i in range(5)]
+    importer = StudentImporter(lines, students={'OLD1': {}}, pending={'P1': {}}, batch_size=3)
+    batches = []
+    while not importer.done:
+        batch = importer.next_batch()
+        if batch: batches.append(batch)
+    report = importer.report
+    reasons = {code: reason for _, code, reason in report.errors}
+    ok = reasons == {'S1': 'duplicate_file', 'OLD1': 'duplicate_student', 'P1': 'duplicate_pending',
+                     'S3': 'short_password', 'S.4': 'bad_code', 'S5': 'missing'}
+    print(f"   Bad rows rejected: {'PASS' if ok else 'FAIL'}")
+    ok = [len(b) for b in batches] == [3, 3, 1] and report.imported == 7 and report.rows == 13
+    print(f"   Batching: {'PASS' if ok else 'FAIL'}")
+    ok = batches[0]['students/S1'] == {'name': 'Ali', 'password': 'pass1', 'materials': []}
+    print(f"   Row data: {'PASS' if ok else 'FAIL'}")
+    ok = [line for line, code, _ in report.errors if code == 'S1'] == [4]
+    print(f"   Error line numbers: {'PASS' if ok else 'FAIL'}")
+
+    # ملف بدون سطر عناوين ثم بايتات ليست UTF-8
+    def latin1_file():
+        yield "Ali,S1,pass1\n"
+        raise UnicodeDecodeError('utf-8', b'\xe9', 0, 1, 'invalid continuation byte')
+    importer = StudentImporter(latin1_file())
+    batch = importer.next_batch()
+    ok = list(batch) == ['students/S1'] and importer.done and importer.report.errors[-1][2] == 'invalid_file'
+    print(f"   Invalid file stops import: {'PASS' if ok else 'FAIL'}")
+
 if __name__ == "__main__":
-    run_test()
+    if '--live' in sys.argv:
+        run_test()
+    else:
+        server = LocalFirebaseServer()
+        FirebaseManager.use_backend(RestBackend(server.start()))
+        run_test(server)
+        run_journal_test(server)
+        run_stream_test(server)
+        run_etag_test(server)
+        run_transport_test(server)
+        run_transaction_test(server)
+        run_migration_test(server)
+        run_async_test(server)
+        run_scope_test(server)
+        server.stop()
+    run_import_test()
@@ -0,0 +1,51 @@
+# utils/change_bus.py - نشر التغييرات الدقيقة (المجموعة، المفتاح، القيمة القديمة/الجديدة) للشاشات
+import threading
+from collections import OrderedDict
+from kivy.clock import Clock
+from utils.snapshot_diff import Change, differs
+
+
+class ChangeBus:
+    """ الاشتراك في تغييرات مجموعة (students, pdfs, ...) بدلاً من إعادة بناء الشاشة كاملة.
+        التغييرات تُجمع وتُسلم مرة واحدة في الإطار التالي: callback(changes) """
+
+    def __init__(self):
+        self._subscribers = []      # [(collections أو None للكل, callback)]
+        self._pending = OrderedDict()   # (collection, key) -> [old, new]
+        self._trigger = None
+        self._lock = threading.Lock()   # النشر قد يأتي من أي خيط، والتسليم دائماً على خيط Kivy
+
+    def subscribe(self, collections, callback):
+        """ collections: اسم مجموعة أو قائمة أسماء أو None لكل التغييرات """
+        if isinstance(collections, str): collections = (collections,)
+        self._subscribers.append((frozenset(collections) if collections is not None else None, callback))
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers = [(c, cb) for c, cb in self._subscribers if cb != callback]
+
+    def publish(self, changes):
+        with self._lock:
+            for change in changes:
+                slot = self._pending.get((change.collection, change.key))
+                if slot is None:
+                    self._pending[(change.collection, change.key)] = [change.old, change.new]
+                else:
+                    slot[1] = change.new
+            if not self._pending: return
+            if self._trigger is None:
+                self._trigger = Clock.create_trigger(self.flush)
+        self._trigger()
+
+    def flush(self, *args):
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        changes = [Change(c, k, old, new) for (c, k), (old, new) in pending.items() if differs(old, new)]
+        if not changes: return
+        for collections, callback in list(self._subscribers):
+            mine = changes if collections is None else [ch for ch in changes if ch.collection in collections]
+            if mine:
+                try:
+                    callback(mine)
+                except Exception as e:
+                    print(f"Change handler error: {e}")
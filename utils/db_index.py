@@ -0,0 +1,76 @@
+# utils/db_index.py - فهارس في الذاكرة لطلبات وصلاحيات ملفات PDF
+from utils.firebase_stream import split_path
+
+
+def as_keyset(value):
+    """ قراءة قائمة الطلاب بأي شكل مخزن:
+        - الشكل الحالي: خريطة {code: true}
+        - خريطة حولها Firebase إلى مصفوفة لأن المفاتيح أرقام صغيرة: [null, true, ...]
+        - الشكل القديم: قائمة أكواد ["123", ...] """
+    if isinstance(value, dict):
+        return [k for k, v in value.items() if v]
+    if isinstance(value, list):
+        if any(v is True for v in value):
+            return [str(i) for i, v in enumerate(value) if v is True]
+        return [str(v) for v in value if v]
+    return []
+
+
+def is_legacy_list(value):
+    """ هل القائمة بالشكل القديم (أكواد داخل مصفوفة) وتحتاج تحويلاً؟ """
+    return isinstance(value, list) and any(v is not None and not isinstance(v, bool) for v in value)
+
+
+class AccessIndex:
+    """ فهارس تُحدّث تدريجياً مع كل تغيير بدلاً من فحص كل الملفات في كل مرة:
+        - الطلبات المعلقة لكل ملف ولكل طالب
+        - الملفات المسموحة لكل طالب """
+
+    def __init__(self):
+        self.pending_by_pdf = {}       # pdf_id -> {student_code: True}
+        self.pending_by_student = {}   # student_code -> {pdf_id: True}
+        self.approved_by_student = {}  # student_code -> {pdf_id: True}
+        self._approved_by_pdf = {}     # pdf_id -> {student_code: True}
+        self.pending_count = 0
+
+    def rebuild(self, pdfs):
+        self.__init__()
+        for pid, pdf in (pdfs or {}).items():
+            self.update_pdf(pid, pdf)
+
+    def update_pdf(self, pdf_id, pdf):
+        """ إعادة فهرسة ملف واحد (pdf = None عند الحذف) """
+        pdf = pdf if isinstance(pdf, dict) else {}
+        before = len(self.pending_by_pdf.get(pdf_id, {}))
+        self._replace(self.pending_by_pdf, self.pending_by_student, pdf_id, pdf.get('pending_download_requests'))
+        self._replace(self._approved_by_pdf, self.approved_by_student, pdf_id, pdf.get('approved_students'))
+        self.pending_count += len(self.pending_by_pdf.get(pdf_id, {})) - before
+
+    def _replace(self, by_pdf, by_student, pdf_id, codes):
+        for code in by_pdf.pop(pdf_id, {}):
+            pids = by_student.get(code)
+            if pids:
+                pids.pop(pdf_id, None)
+                if not pids: del by_student[code]
+        codes = dict.fromkeys(as_keyset(codes))
+        if codes:
+            by_pdf[pdf_id] = codes
+            for code in codes:
+                by_student.setdefault(code, {})[pdf_id] = True
+
+    def apply_change(self, path, pdfs):
+        """ تحديث الفهارس بعد تغيير في المسار path؛ ترجع False إذا لم يمس الملفات """
+        keys = split_path(path)
+        if not keys or (keys[0] == 'pdfs' and len(keys) == 1):
+            self.rebuild(pdfs)
+        elif keys[0] == 'pdfs':
+            self.update_pdf(keys[1], (pdfs or {}).get(keys[1]))
+        else:
+            return False
+        return True
+
+    def is_approved(self, pdf_id, student_code):
+        return pdf_id in self.approved_by_student.get(student_code, {})
+
+    def is_pending(self, pdf_id, student_code):
+        return pdf_id in self.pending_by_student.get(student_code, {})
@@ -0,0 +1,130 @@
+# utils/firebase_async.py - واجهة async/await فوق FirebaseManager (تعمل مع App.async_run في Kivy)
+import asyncio
+from utils.firebase_manager import FirebaseManager
+
+
+class FirebaseError(Exception):
+    """ فشل طلب أو كتابة على السيرفر """
+
+
+def _future():
+    """ Future على الحلقة الحالية مع دالة تُكمله بأمان من أي خيط (مرة واحدة فقط) """
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def settle(fn, value):
+        if not fut.done(): fn(value)
+
+    def resolve(value=None):
+        loop.call_soon_threadsafe(settle, fut.set_result, value)
+
+    def reject(err):
+        loop.call_soon_threadsafe(settle, fut.set_exception, err if isinstance(err, Exception) else FirebaseError(err))
+
+    return fut, resolve, reject
+
+
+_tasks = set()
+
+def run_async(coro):
+    """ تشغيل coroutine من دالة عادية (زر في الواجهة) على حلقة asyncio التي يعمل عليها Kivy """
+    task = asyncio.get_running_loop().create_task(coro)
+    _tasks.add(task)   # مرجع حتى لا تُحذف المهمة قبل انتهائها
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+class AsyncFirebaseManager:
+    """ نفس عمليات FirebaseManager لكن يمكن انتظارها (await) وتشغيلها بالتوازي (asyncio.gather).
+        كل عملية تكتمل من on_done الخاص بها هي فقط، والكتابات المتزامنة تُجمع في نفس الـ PATCH """
+
+    # ─── قراءة ───
+    @staticmethod
+    async def get(path, **params):
+        """ قراءة مشروطة من السيرفر (ETag + دمج الطلبات المتطابقة) """
+        fut, ok, fail = _future()
+        FirebaseManager._call_api(path, "GET", params=params or None, on_success=ok, on_failure=fail)
+        return await fut
+
+    @staticmethod
+    async def get_many(paths):
+        """ جلب عدة مسارات بالتوازي وإرجاع {path: value} """
+        values = await asyncio.gather(*(AsyncFirebaseManager.get(p) for p in paths))
+        return dict(zip(paths, values))
+
+    @staticmethod
+    async def sync():
+        fut, ok, fail = _future()
+        FirebaseManager.sync_data(on_finish=ok, on_failure=fail)
+        await fut
+
+    @staticmethod
+    async def lookup_student(code):
+        """ يرجع (record, source) كما في FirebaseManager.lookup_student """
+        fut, ok, _ = _future()
+        FirebaseManager.lookup_student(code, lambda record, source: ok((record, source)))
+        return await fut
+
+    @staticmethod
+    async def fetch_announcements(limit=None, before=None):
+        fut, ok, fail = _future()
+        FirebaseManager.fetch_announcements(limit, before, on_done=ok, on_failure=fail)
+        return await fut
+
+    # ─── كتابة ───
+    @staticmethod
+    async def write(updates):
+        """ كتابة عدة مسارات {path: value} كتحديث واحد ذري؛ يرجع بعد تأكيد السيرفر """
+        fut, ok, _ = _future()
+        FirebaseManager._write(updates, ok)
+        if not await fut:
+            raise FirebaseError("write was not confirmed by the server")
+
+    @staticmethod
+    async def transaction(path, update, max_attempts=None):
+        """ FirebaseManager.transaction: يرجع القيمة التي أكدها السيرفر """
+        fut, ok, _ = _future()
+        FirebaseManager.transaction(path, update, lambda done, value: ok((done, value)), max_attempts)
+        done, value = await fut
+        if not done:
+            raise FirebaseError(f"transaction on {path} failed: {value}")
+        return value
+
+    @staticmethod
+    async def gather(*operations, return_exceptions=True):
+        """ تشغيل عدة عمليات معاً. الأخطاء تُرجع كنتائج افتراضياً حتى لا تُلغي فشل واحدة البقية """
+        return await asyncio.gather(*operations, return_exceptions=return_exceptions)
+
+
+def _wrap(name, wrote):
+    method = getattr(FirebaseManager, name)
+
+    async def op(*args, **kwargs):
+        fut, ok, _ = _future()
+        result = method(*args, on_done=ok, **kwargs)
+        # بدون كتابة (رفض محلي أو لا يوجد ما يتغير) لا يُستدعى on_done: النتيجة نهائية فوراً
+        if not wrote(result): return result
+        if not await fut:
+            raise FirebaseError(f"{name} was not confirmed by the server")
+        return result
+
+    op.__name__ = name
+    op.__doc__ = f""" نسخة async من FirebaseManager.{name}: نفس قيمة الإرجاع بعد تأكيد السيرفر """
+    return staticmethod(op)
+
+
+# العملية -> هل أرسلت كتابة، حسب قيمة إرجاعها
+_always = lambda result: True
+_truthy = bool
+_first = lambda result: result[0]
+
+for _name, _wrote in (
+        ('save_student', _always), ('delete_student', _truthy), ('change_password', _truthy),
+        ('submit_registration_request', _first),
+        ('approve_request', _truthy), ('reject_request', _truthy),
+        ('approve_requests', _truthy), ('reject_requests', _truthy),
+        ('save_pdf', _always), ('delete_pdf', _truthy),
+        ('approve_pdf_access', _truthy), ('resolve_pdf_requests', _truthy),
+        ('save_subject', _always), ('delete_subject', _truthy), ('add_pdf_to_subject', _truthy),
+        ('add_announcement', _always), ('save_admin_settings', _always)):
+    setattr(AsyncFirebaseManager, _name, _wrap(_name, _wrote))
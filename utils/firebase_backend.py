@@ -0,0 +1,52 @@
+# utils/firebase_backend.py - واجهة قابلة للتبديل بين سيرفر Firebase الحقيقي وسيرفر محلي للاختبار
+from abc import ABC, abstractmethod
+from urllib.parse import quote
+from utils.http_pool import HttpPool, PRIORITY_BACKGROUND
+from utils.firebase_stream import FirebaseStream
+
+
+class FirebaseBackend(ABC):
+    """ الواجهة التي يعتمد عليها FirebaseManager للوصول إلى قاعدة البيانات """
+
+    @abstractmethod
+    def request(self, method, path, data=None, params=None, headers=None,
+                on_success=None, on_failure=None, priority=PRIORITY_BACKGROUND, on_response=None):
+        """ تنفيذ طلب REST في الخلفية؛ on_response(status, result, etag) يستقبل أي رد من السيرفر """
+
+    @abstractmethod
+    def stream(self, path, on_event):
+        """ إنشاء بث (put/patch) للمسار وإرجاع كائن يحتوي start() و stop() """
+
+    def metrics(self):
+        """ مقاييس الاتصال (عدد الطلبات، الفشل، إعادة المحاولة...) """
+        return {}
+
+    def close(self):
+        pass
+
+
+class RestBackend(FirebaseBackend):
+    """ Firebase Realtime Database عبر REST (الإنتاج أو local_firebase_server) """
+
+    def __init__(self, base_url, pool_size=4):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.pool = HttpPool(self.base_url, pool_size)
+
+    def url(self, path):
+        return f"{self.base_url}{quote(path, safe='/')}.json"
+
+    def request(self, method, path, data=None, params=None, headers=None,
+                on_success=None, on_failure=None, priority=PRIORITY_BACKGROUND, on_response=None):
+        self.pool.request(method, path, data=data, params=params, headers=headers,
+                          on_success=on_success, on_failure=on_failure, priority=priority, on_response=on_response)
+
+    def stream(self, path, on_event):
+        return FirebaseStream(self.url(path), on_event)
+
+    def metrics(self):
+        data = self.pool.metrics.snapshot()
+        data['circuit'] = self.pool.breaker.state
+        return data
+
+    def close(self):
+        self.pool.stop()
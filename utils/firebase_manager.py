@@ -1,31 +1,328 @@
 # utils/firebase_manager.py - محرك البيانات السحابي (Live Firebase Connection)
-import json
+import heapq
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from kivy.network.urlrequest import UrlRequest
+from types import MappingProxyType
+from kivy.clock import Clock
 from functools import partial
+from utils.firebase_stream import apply_event, get_path, set_path, split_path
+from utils import local_store
+from utils.write_buffer import WriteBuffer
+from utils.write_journal import WriteJournal, journal_path
+from utils.http_pool import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, error_status
+from utils.retry_policy import RetryPolicy
+from utils.firebase_backend import RestBackend
+from utils.db_index import AccessIndex, as_keyset, is_legacy_list
+from utils.change_bus import ChangeBus
+from utils.snapshot_diff import diff_paths, record_updates
+from utils.student_import import StudentImporter, open_csv
 
 # ملاحظة: سنستخدم الـ REST API الخاص بـ Firebase للربط السحابي
-FIREBASE_URL = "https://mystudent-syste-default-rtdb.firebaseio.com/"
+# يمكن توجيه التطبيق لسيرفر آخر (مثل utils/local_firebase_server.py) عبر متغير البيئة
+FIREBASE_URL = os.environ.get('MYSTUDENT_FIREBASE_URL', "https://mystudent-syste-default-rtdb.firebaseio.com/")
 
 class FirebaseManager:
     """ محرك لإدارة البيانات عبر Firebase Realtime Database أونلاين """
 
+    _backend = None
+
+    @staticmethod
+    def _get_backend():
+        if FirebaseManager._backend is None:
+            FirebaseManager._backend = RestBackend(FIREBASE_URL)
+        return FirebaseManager._backend
+
+    @staticmethod
+    def use_backend(backend):
+        """ تبديل مصدر البيانات (مثلاً RestBackend لسيرفر محلي أثناء الاختبار) """
+        FirebaseManager.stop_realtime_sync()
+        if FirebaseManager._backend is not None and FirebaseManager._backend is not backend:
+            FirebaseManager._backend.close()
+        FirebaseManager._backend = backend
+
+    @staticmethod
+    def get_transport_metrics():
+        return FirebaseManager._get_backend().metrics()
+
     @staticmethod
-    def _call_api(path, method="GET", data=None, on_success=None, on_failure=None):
+    def _call_api(path, method="GET", data=None, on_success=None, on_failure=None, priority=None, params=None):
         """ دالة مساعدة للاتصال بـ Firebase REST API """
-        url = f"{FIREBASE_URL}{path}.json"
-        body = json.dumps(data) if data else None
-        
-        # استخدام UrlRequest لضمان عدم تعليق واجهات التطبيق (Non-blocking)
-        req = UrlRequest(
-            url,
-            method=method,
-            req_body=body,
-            on_success=lambda r, result: on_success(result) if on_success else None,
-            on_failure=lambda r, err: on_failure(err) if on_failure else print(f"API Error: {err}"),
-            on_error=lambda r, err: print(f"Network Error: {err}")
+        if method == "GET":
+            return FirebaseManager._conditional_get(path, params, on_success, on_failure, priority)
+        # الطلب يُنفذ في خيوط المجموعة ولا يعلّق واجهات التطبيق (Non-blocking)
+        FirebaseManager._get_backend().request(
+            method, path, data=data, params=params,
+            priority=PRIORITY_BACKGROUND if priority is None else priority,
+            on_success=on_success, on_failure=on_failure
         )
-        return req
+
+    ETAG_CACHE_SIZE = 32
+    _etags = OrderedDict()   # (path, params) -> (etag, result)
+    _inflight = {}           # (path, params) -> [(on_success, on_failure), ...]
+    _get_lock = threading.Lock()
+
+    @staticmethod
+    def _conditional_get(path, params=None, on_success=None, on_failure=None, priority=None):
+        """ قراءة مشروطة: If-None-Match بآخر ETag (رد 304 بدون بيانات إذا لم يتغير شيء)،
+            والطلبات المتطابقة أثناء التنفيذ تنتظر نفس الطلب بدلاً من تكراره """
+        key = (path, tuple(sorted((params or {}).items())))
+        with FirebaseManager._get_lock:
+            waiters = FirebaseManager._inflight.get(key)
+            if waiters is not None:
+                waiters.append((on_success, on_failure))
+                return
+            FirebaseManager._inflight[key] = [(on_success, on_failure)]
+            cached = FirebaseManager._etags.get(key)
+
+        headers = {'X-Firebase-ETag': 'true'}
+        if cached: headers['If-None-Match'] = cached[0]
+
+        def finish(ok, value):
+            with FirebaseManager._get_lock:
+                waiters = FirebaseManager._inflight.pop(key, [])
+            for success, failure in waiters:
+                cb = success if ok else (failure or (lambda err: print(f"API Error: {err}")))
+                if cb: cb(value)
+
+        def response(status, result, etag):
+            if status == 304 and cached:
+                with FirebaseManager._get_lock:
+                    if key in FirebaseManager._etags: FirebaseManager._etags.move_to_end(key)
+                return finish(True, cached[1])
+            with FirebaseManager._get_lock:
+                if not 200 <= status < 300:
+                    FirebaseManager._etags.pop(key, None)
+                elif etag:
+                    FirebaseManager._etags[key] = (etag, result)
+                    FirebaseManager._etags.move_to_end(key)
+                    while len(FirebaseManager._etags) > FirebaseManager.ETAG_CACHE_SIZE:
+                        FirebaseManager._etags.popitem(last=False)
+            if not 200 <= status < 300:
+                return finish(False, f"HTTP {status}")
+            finish(True, result)
+
+        # القراءات التي ينتظرها المستخدم تتقدم على الكتابات الخلفية في الطابور
+        FirebaseManager._get_backend().request(
+            "GET", path, params=params, headers=headers,
+            priority=PRIORITY_INTERACTIVE if priority is None else priority,
+            on_response=response, on_failure=lambda err: finish(False, err)
+        )
+
+    WRITE_WINDOW = 0.3  # ثوانٍ لتجميع الكتابات في طلب PATCH واحد
+    _write_buffer = None
+
+    @staticmethod
+    def _writes():
+        if FirebaseManager._write_buffer is None:
+            FirebaseManager._write_buffer = WriteBuffer(
+                lambda updates, ok, fail: FirebaseManager._call_api("", "PATCH", data=updates, on_success=ok, on_failure=fail),
+                FirebaseManager.WRITE_WINDOW
+            )
+        return FirebaseManager._write_buffer
+
+    @staticmethod
+    def _write(updates, on_done=None):
+        """ تحديث النسخة المحلية فوراً ثم إضافة المسارات {path: value} للدفعة التالية (None = حذف).
+            العملية تُسجل في السجل الدائم أولاً ولا تُحذف منه إلا بعد تأكيد السيرفر. """
+        # نفس القفل يضمن أن ترتيب الكتابات في السجل والدفعة هو نفس ترتيب تطبيقها محلياً
+        with FirebaseManager._db_lock:
+            FirebaseManager._apply_delta('patch', '/', updates)
+            key = FirebaseManager._get_journal().append(updates)
+            FirebaseManager._send_journaled(key, updates, on_done)
+
+    REPLAY_DELAY = 15  # ثوانٍ قبل إعادة محاولة إرسال الكتابات المعلقة
+    _journal = None
+    _inflight_keys = set()
+    _acked_keys = []
+    _ack_trigger = None
+    _replay_event = None
+    _replaying = False
+    _waiting = OrderedDict()   # key -> on_done لعمليات تنتظر نتيجة إعادة الإرسال
+    _retry_policy = RetryPolicy()
+
+    @staticmethod
+    def _get_journal():
+        if FirebaseManager._journal is None:
+            FirebaseManager._journal = WriteJournal(journal_path())
+        return FirebaseManager._journal
+
+    @staticmethod
+    def _send_journaled(key, updates, on_done=None):
+        if FirebaseManager._replaying:
+            # أثناء إعادة الإرسال تُرسل العمليات الجديدة بعد القديمة وبنفس ترتيبها
+            if on_done: FirebaseManager._waiting[key] = on_done
+            return
+        FirebaseManager._inflight_keys.add(key)
+        failure = {}
+
+        def done(ok):
+            FirebaseManager._inflight_keys.discard(key)
+            if ok:
+                FirebaseManager._ack(key)
+            elif FirebaseManager._retry_policy.is_permanent(error_status(failure.get('error'))):
+                # السيرفر رفض الدفعة كلها بسبب عملية واحدة منها: نعيد إرسالها كل عملية وحدها
+                # ونؤجل on_done حتى تُعرف نتيجة هذه العملية بالذات
+                if on_done: FirebaseManager._waiting[key] = on_done
+                Clock.schedule_once(FirebaseManager.replay_journal)
+                return
+            else:
+                FirebaseManager._schedule_replay()
+            if on_done: on_done(ok)
+
+        FirebaseManager._writes().add(updates, done, on_error=lambda error: failure.update(error=error))
+
+    @staticmethod
+    def _ack(key):
+        FirebaseManager._acked_keys.append(key)
+        if FirebaseManager._ack_trigger is None:
+            FirebaseManager._ack_trigger = Clock.create_trigger(FirebaseManager._flush_acks)
+        FirebaseManager._ack_trigger()
+
+    @staticmethod
+    def _flush_acks(*args):
+        # تأكيد كل عمليات الدفعة بسطر واحد في السجل
+        keys, FirebaseManager._acked_keys = FirebaseManager._acked_keys, []
+        FirebaseManager._get_journal().ack(keys)
+
+    @staticmethod
+    def _schedule_replay():
+        if FirebaseManager._replay_event is None:
+            # تأخير عشوائي حتى لا تعيد كل الأجهزة الإرسال في نفس اللحظة بعد عودة السيرفر
+            delay = FirebaseManager.REPLAY_DELAY * random.uniform(0.5, 1.5)
+            FirebaseManager._replay_event = Clock.schedule_once(FirebaseManager.replay_journal, delay)
+
+    @staticmethod
+    def replay_journal(*args):
+        """ إعادة إرسال الكتابات المعلقة بنفس ترتيبها عند عودة الاتصال.
+            كل عملية في طلب مستقل بعد انتهاء التي قبلها، فرفض السيرفر لعملية لا يوقف ما بعدها """
+        if FirebaseManager._replay_event is not None:
+            FirebaseManager._replay_event.cancel()
+            FirebaseManager._replay_event = None
+        if FirebaseManager._replaying: return 0
+        pending = [k for k, u in FirebaseManager._get_journal().pending() if k not in FirebaseManager._inflight_keys]
+        if pending:
+            FirebaseManager._replaying = True
+            FirebaseManager._replay_next()
+        return len(pending)
+
+    @staticmethod
+    def _replay_next():
+        with FirebaseManager._db_lock:
+            # السجل يُقرأ في كل خطوة ليشمل ما كُتب أثناء إعادة الإرسال
+            entry = next(((k, u) for k, u in FirebaseManager._get_journal().pending()
+                          if k not in FirebaseManager._inflight_keys and k not in FirebaseManager._acked_keys), None)
+            if entry is None:
+                FirebaseManager._replaying = False
+                return
+            key, updates = entry
+            FirebaseManager._inflight_keys.add(key)
+
+        def sent(result):
+            FirebaseManager._inflight_keys.discard(key)
+            FirebaseManager._ack(key)
+            FirebaseManager._resolve(key, True)
+            FirebaseManager._replay_next()
+
+        def failed(error):
+            FirebaseManager._inflight_keys.discard(key)
+            if FirebaseManager._retry_policy.is_permanent(error_status(error)):
+                FirebaseManager._reject(key, updates, error)
+                return FirebaseManager._replay_next()
+            # السيرفر غير متاح: التوقف والمحاولة لاحقاً
+            FirebaseManager._replaying = False
+            for waiting in list(FirebaseManager._waiting): FirebaseManager._resolve(waiting, False)
+            FirebaseManager._schedule_replay()
+
+        FirebaseManager._call_api("", "PATCH", data=updates, on_success=sent, on_failure=failed)
+
+    @staticmethod
+    def _resolve(key, ok):
+        on_done = FirebaseManager._waiting.pop(key, None)
+        if on_done: on_done(ok)
+
+    @staticmethod
+    def _reject(key, updates, error):
+        """ رفض نهائي (4xx): العملية تُحذف من السجل حتى لا تُعاد للأبد، وتُستعاد السجلات
+            التي غيّرتها من السيرفر فيختفي أثرها المحلي """
+        print(f"Write rejected: {error}")
+        FirebaseManager._get_journal().ack([key])
+        records = OrderedDict.fromkeys('/'.join(split_path(path)[:2]) for path in updates)
+        for path in records:
+            FirebaseManager._call_api(path, "GET", on_success=partial(FirebaseManager._reconcile, path),
+                                      on_failure=lambda err: print(f"API Error: {err}"))
+        FirebaseManager._resolve(key, False)
+
+    @staticmethod
+    def _reapply_journal():
+        # بيانات السيرفر (أو النسخة المحلية) قد لا تحتوي بعد على الكتابات غير المؤكدة
+        for key, updates in FirebaseManager._get_journal().pending():
+            FirebaseManager._apply_delta('patch', '/', updates)
+
+    @staticmethod
+    def flush_writes(on_done=None):
+        """ إرسال الكتابات المعلقة فوراً بدون انتظار نافذة التجميع """
+        FirebaseManager._writes().flush(on_done)
+
+    TRANSACTION_ATTEMPTS = 5
+    _NO_VALUE = object()
+
+    @staticmethod
+    def transaction(path, update, on_done=None, max_attempts=None):
+        """ قراءة-تعديل-كتابة آمنة مع عدة مدراء في نفس الوقت (ETag + if-match).
+            update(current) ترجع القيمة الجديدة (None = حذف) وقد تُستدعى أكثر من مرة:
+            إذا كتب شخص آخر أولاً يرد السيرفر 412 مع القيمة الحالية فنعيد الدمج والمحاولة.
+            التغيير يظهر محلياً فوراً، و on_done(ok, value) بعد تأكيد السيرفر. """
+        max_attempts = max_attempts or FirebaseManager.TRANSACTION_ATTEMPTS
+        backend = FirebaseManager._get_backend()
+        state = {'attempts': 0, 'server': FirebaseManager._NO_VALUE}
+
+        original = get_path(FirebaseManager._cached_db, path)
+        FirebaseManager._apply_delta('put', path, update(original))
+
+        def finish(ok, value):
+            if not ok:
+                # التراجع عن التحديث المتفائل إلى آخر قيمة معروفة من السيرفر
+                known = state['server']
+                FirebaseManager._apply_delta('put', path, original if known is FirebaseManager._NO_VALUE else known)
+                print(f"Transaction on {path} failed: {value}")
+            if on_done: on_done(ok, value)
+
+        def attempt(current, etag):
+            state['server'] = current
+            new = update(current)
+            if new == current:
+                FirebaseManager._apply_delta('put', path, current)
+                return finish(True, current)
+            state['attempts'] += 1
+            backend.request(
+                'DELETE' if new is None else 'PUT', path, data=new,
+                headers={'if-match': etag, 'X-Firebase-ETag': 'true'}, priority=PRIORITY_INTERACTIVE,
+                on_response=lambda status, result, tag: written(new, status, result, tag),
+                on_failure=lambda err: finish(False, err)
+            )
+
+        def written(new, status, result, etag):
+            if 200 <= status < 300:
+                FirebaseManager._apply_delta('put', path, new)
+                return finish(True, new)
+            if status == 412 and etag and state['attempts'] < max_attempts:
+                return attempt(result, etag)
+            finish(False, f"HTTP {status}")
+
+        def read(status, result, etag):
+            if 200 <= status < 300 and etag:
+                return attempt(result, etag)
+            finish(False, f"HTTP {status}")
+
+        # الكتابات المجمعة على نفس المسار يجب أن تصل قبل قراءة الـ ETag
+        FirebaseManager.flush_writes(lambda ok: backend.request(
+            'GET', path, headers={'X-Firebase-ETag': 'true'}, priority=PRIORITY_INTERACTIVE,
+            on_response=read, on_failure=lambda err: finish(False, err)
+        ))
 
     # ملاحظة سرية: لجعل التطبيق يعمل بنفس المنطق "المتزامن" للـ UI الحالي 
     # سنستخدم استراتيجية سريعة وهي جلب البيانات محلياً أول مرة وحفظها لتقليل الطلبات.
@@ -37,40 +334,375 @@ class FirebaseManager:
     # ملاحظة هامة: نظراً لطبيعة Kivy الـ asynchronous، 
     # سأقوم بتعديل بسيط جداً ليتناسب مع الكود الحالي دون كسر الواجهات.
 
+    # الشجرة لا تُعدّل في مكانها أبداً: كل كتابة تنسخ العقد على مسارها فقط (copy-on-write)
+    # ثم تستبدل الجذر دفعة واحدة، فأي قارئ يحتفظ بنسخة ثابتة حتى لو وصلت مزامنة أثناء العرض.
+    # كل التعديلات تمر عبر _apply_delta تحت _db_lock حتى من خيوط أخرى.
     _cached_db = {}
+    _db_lock = threading.RLock()
+    SNAPSHOT_DELAY = 2  # ثوانٍ لتجميع عدة تحديثات في كتابة واحدة على القرص
+    _snapshot_trigger = None
+    _snapshot_lock = threading.Lock()    # كتابة واحدة للملف في نفس الوقت
+    _snapshot_state = threading.Lock()
+    _snapshot_running = False
+    _snapshot_dirty = False
 
     @staticmethod
-    def sync_data(on_finish=None):
-        """ جلب نسخة كاملة من البيانات عند بدء التطبيق """
-        def success(res):
-            FirebaseManager._cached_db = res if res else {}
-            if on_finish: on_finish()
-        FirebaseManager._call_api("", "GET", on_success=success)
+    def load_snapshot():
+        """ تحميل النسخة المحلية فوراً عند بدء التطبيق (قبل وصول بيانات السيرفر) """
+        data = local_store.load_snapshot()
+        with FirebaseManager._db_lock:
+            FirebaseManager._cached_db = data
+            FirebaseManager._index.rebuild(FirebaseManager.get_pdfs())
+            FirebaseManager._reapply_journal()
+        return bool(FirebaseManager._cached_db)
+
+    @staticmethod
+    def save_snapshot(*args):
+        """ حفظ فوري على الخيط الحالي (عند الإغلاق أو تغيير النطاق) """
+        with FirebaseManager._snapshot_lock:
+            # الجذر يُقرأ داخل القفل: آخر كتابة للملف هي دائماً أحدث نسخة
+            return local_store.save_snapshot(FirebaseManager._cached_db)
+
+    @staticmethod
+    def _save_snapshot_background(*args):
+        """ الشجرة لا تُعدّل في مكانها، فتحويلها إلى JSON وكتابتها يتم في خيط خلفي بدون تعليق الواجهة.
+            إذا تغيرت البيانات أثناء الحفظ يُعاد الحفظ مرة واحدة بعده بدلاً من تشغيل خيط آخر """
+        with FirebaseManager._snapshot_state:
+            if FirebaseManager._snapshot_running:
+                FirebaseManager._snapshot_dirty = True
+                return
+            FirebaseManager._snapshot_running = True
+        threading.Thread(target=FirebaseManager._snapshot_worker, name='SnapshotWriter', daemon=True).start()
+
+    @staticmethod
+    def _snapshot_worker():
+        while True:
+            FirebaseManager.save_snapshot()
+            with FirebaseManager._snapshot_state:
+                if not FirebaseManager._snapshot_dirty:
+                    FirebaseManager._snapshot_running = False
+                    return
+                FirebaseManager._snapshot_dirty = False
+
+    @staticmethod
+    def _schedule_snapshot():
+        if FirebaseManager._snapshot_trigger is None:
+            FirebaseManager._snapshot_trigger = Clock.create_trigger(FirebaseManager._save_snapshot_background, FirebaseManager.SNAPSHOT_DELAY)
+        FirebaseManager._snapshot_trigger()
+
+    # نطاق المزامنة حسب الدور: الطالب لا يحمّل بيانات الطلاب الآخرين ولا الطلبات ولا إعدادات الأدمن
+    PUBLIC_PATHS = ('subjects', 'announcements', 'pdfs', 'admin_settings')
+    _scope = None   # لم يُحدد بعد = كل القاعدة (الاختبارات والأدوات)، والتطبيق يحدده حسب الدور
+
+    @staticmethod
+    def _active_scope():
+        return FirebaseManager._scope or ('',)
+
+    @staticmethod
+    def sync_paths(role, user_code=''):
+        """ المسارات التي يحتاجها كل دور (guest / student / admin) """
+        if role == 'admin':
+            return ('',)
+        if role == 'student' and user_code:
+            return (f"students/{user_code}",) + FirebaseManager.PUBLIC_PATHS
+        return FirebaseManager.PUBLIC_PATHS
+
+    MAX_DEVICE_STUDENTS = 5
+    _device_students = None   # أكواد من دخلوا من هذا الجهاز، الأحدث في الآخر
+
+    @staticmethod
+    def device_students():
+        if FirebaseManager._device_students is None:
+            FirebaseManager._device_students = local_store.load_device_students()
+        return list(FirebaseManager._device_students)
+
+    @staticmethod
+    def remember_device_student(code):
+        codes = [c for c in FirebaseManager.device_students() if c != code] + [code]
+        FirebaseManager._device_students = codes[-FirebaseManager.MAX_DEVICE_STUDENTS:]
+        local_store.save_device_students(FirebaseManager._device_students)
+
+    @staticmethod
+    def set_sync_scope(role, user_code=''):
+        """ تغيير نطاق المزامنة عند الدخول/الخروج: حذف ما خرج عن النطاق محلياً وإعادة فتح البث """
+        scope, previous = FirebaseManager.sync_paths(role, user_code), FirebaseManager._scope
+        if scope == previous: return False
+        FirebaseManager._scope = scope
+        if role == 'student' and user_code:
+            FirebaseManager.remember_device_student(user_code)
+        if scope != ('',):
+            # تبقى سجلات من دخلوا من هذا الجهاز فقط (للدخول بدون اتصال بعد إعادة التشغيل)؛
+            # قائمة الطلاب الكاملة (بكلمات المرور) لا تبقى حتى لو كانت في نسخة محفوظة من جلسة أدمن
+            keep = list(scope)
+            keep += [f"students/{code}" for code in FirebaseManager.device_students() if f"students/{code}" not in keep]
+            kept = {}
+            for path in keep:
+                kept = set_path(kept, path, get_path(FirebaseManager._cached_db, path))
+            FirebaseManager._reconcile('', kept)
+            FirebaseManager.save_snapshot()
+        if FirebaseManager._streams:
+            FirebaseManager.start_realtime_sync()
+        return True
+
+    # مسارات وصلت لقطتها من السيرفر في هذه الجلسة. قبلها قد تكون النسخة المحلية من الملف المحفوظ
+    # أو من local_db.json المرفق، فلا يُبنى عليها أي تحويل للبيانات على السيرفر
+    _confirmed = set()
+    _confirm_waiters = []   # [(path, callback)]
+
+    @staticmethod
+    def is_confirmed(path):
+        keys = split_path(path)
+        return any(keys[:len(split_path(p))] == split_path(p) for p in FirebaseManager._confirmed)
+
+    @staticmethod
+    def when_confirmed(path, callback):
+        """ تنفيذ callback() بعد أول لقطة من السيرفر تشمل المسار (فوراً إن كانت وصلت) """
+        if FirebaseManager.is_confirmed(path):
+            callback()
+        else:
+            FirebaseManager._confirm_waiters.append((path, callback))
+
+    @staticmethod
+    def _confirm(path):
+        FirebaseManager._confirmed.add(path)
+        ready = [w for w in FirebaseManager._confirm_waiters if FirebaseManager.is_confirmed(w[0])]
+        FirebaseManager._confirm_waiters = [w for w in FirebaseManager._confirm_waiters if w not in ready]
+        for _, callback in ready: callback()
+
+    @staticmethod
+    def sync_data(on_finish=None, on_failure=None):
+        """ جلب نسخة من البيانات التي يشملها نطاق المزامنة الحالي """
+        paths = FirebaseManager._active_scope()
+        state = {'left': len(paths), 'failed': False}
+
+        def success(path, res):
+            FirebaseManager._reconcile(path, res)
+            FirebaseManager._confirm(path)
+            state['left'] -= 1
+            if state['left'] == 0 and not state['failed']:
+                FirebaseManager.replay_journal()
+                if on_finish: on_finish()
+
+        def failure(err):
+            if not state['failed']:
+                state['failed'] = True
+                if on_failure: on_failure(err)
+                else: print(f"API Error: {err}")
+
+        for path in paths:
+            FirebaseManager._call_api(path, "GET", on_success=partial(success, path), on_failure=failure)
+
+    _streams = []
+
+    @staticmethod
+    def start_realtime_sync(on_finish=None, on_change=None):
+        """ مزامنة لحظية لكل مسار في النطاق: أول حدث put هو لقطة المسار، وبعدها تصل التغييرات فقط (put/patch) """
+        FirebaseManager.stop_realtime_sync()
+        waiting = set(FirebaseManager._active_scope())
+
+        def handle(base, event, payload):
+            if event in ('put', 'patch') and isinstance(payload, dict):
+                rel = payload.get('path', '/')
+                path = '/'.join(split_path(base) + split_path(rel))
+                if event == 'put':
+                    FirebaseManager._reconcile(path, payload.get('data'))
+                else:
+                    FirebaseManager._apply_delta(event, path, payload.get('data'))
+                if event == 'put' and not split_path(rel):
+                    # لقطة كاملة للمسار (بداية الاتصال أو إعادته): الاتصال عاد فنرسل المعلق
+                    FirebaseManager._confirm(base)
+                    FirebaseManager.replay_journal()
+                if base in waiting:
+                    waiting.discard(base)
+                    if not waiting and on_finish: on_finish()
+                if on_change: on_change(event, path)
+            elif event in ('cancel', 'auth_revoked'):
+                print(f"Stream {event}: {payload}")
+
+        for base in FirebaseManager._active_scope():
+            stream = FirebaseManager._get_backend().stream(base, partial(handle, base))
+            FirebaseManager._streams.append(stream)
+            stream.start()
+
+    @staticmethod
+    def stop_realtime_sync():
+        streams, FirebaseManager._streams = FirebaseManager._streams, []
+        for stream in streams:
+            stream.stop()
+
+    @staticmethod
+    def _apply_delta(event, path, data, changes=None):
+        """ تطبيق تغيير على مستوى المسار داخل النسخة المحلية (كتابة محلية أو حدث من السيرفر).
+            changes: التغييرات إذا كانت محسوبة مسبقاً (من _reconcile) حتى لا تُقارن مرتين """
+        paths = FirebaseManager._changed_paths(event, path, data)
+        with FirebaseManager._db_lock:
+            old = FirebaseManager._cached_db
+            new = apply_event(old, event, path, data)
+            FirebaseManager._cached_db = new
+            FirebaseManager._reindex(paths)
+            FirebaseManager._forget_lookups(paths)
+            FirebaseManager._bus.publish(changes if changes is not None else diff_paths(old, new, paths))
+        FirebaseManager._schedule_snapshot()
+
+    @staticmethod
+    def _reconcile(path, value):
+        """ دمج لقطة كاملة من السيرفر للمسار path: بدلاً من استبدال الشجرة تُطبق السجلات المتغيرة فقط،
+            فتبقى العقد غير المتغيرة مشتركة ولا تُحدّث الفهارس والشاشات إلا لما تغير فعلاً.
+            الكتابات المحلية غير المؤكدة تبقى فوق بيانات السيرفر. """
+        with FirebaseManager._db_lock:
+            current = FirebaseManager._cached_db
+            target = set_path(current, path, value)
+            for key, updates in FirebaseManager._get_journal().pending():
+                target = apply_event(target, 'patch', '/', updates)
+            changes = diff_paths(current, target, [path])
+            if changes:
+                updates = record_updates(changes)
+                # مجموعة تغير شكلها (القائمة القديمة <-> خريطة) تُستبدل كاملة،
+                # وإلا تتحول مواضع المصفوفة إلى مفاتيح "0", "1" ولا يُعرف أنها بالشكل القديم
+                for coll in {c.collection for c in changes if c.key is not None}:
+                    if isinstance(get_path(current, coll), list) != isinstance(get_path(target, coll), list):
+                        updates = {p: v for p, v in updates.items() if split_path(p)[0] != coll}
+                        updates[coll] = get_path(target, coll)
+                FirebaseManager._apply_delta('patch', '/', updates, changes)
+        return len(changes)
+
+    @staticmethod
+    def _changed_paths(event, path, data):
+        if event == 'patch':
+            base = '/'.join(split_path(path))
+            return [f"{base}/{key}" if base else key for key in (data or {})]
+        return [path]
+
+    _index = AccessIndex()
+
+    @staticmethod
+    def _reindex(paths):
+        """ تحديث الفهارس للمسارات التي تغيرت فقط """
+        pdfs = FirebaseManager.get_pdfs()
+        for path in paths:
+            FirebaseManager._index.apply_change(path, pdfs)
+
+    _bus = ChangeBus()
+
+    @staticmethod
+    def subscribe(collections, callback):
+        """ استقبال التغييرات [Change(collection, key, old, new)] للمجموعات المحددة مجمعة مرة كل إطار """
+        return FirebaseManager._bus.subscribe(collections, callback)
+
+    @staticmethod
+    def unsubscribe(callback):
+        FirebaseManager._bus.unsubscribe(callback)
+
+    @staticmethod
+    def snapshot():
+        """ الجذر الحالي كنسخة ثابتة (لا تُعدّل) لقراءة عدة مجموعات من نفس اللحظة """
+        return FirebaseManager._cached_db
+
+    @staticmethod
+    def _collection(name, default=None):
+        # عرض للقراءة فقط: الشاشات لا تستطيع تعديل النسخة المشتركة بالخطأ
+        value = FirebaseManager._cached_db.get(name, default if default is not None else {})
+        return MappingProxyType(value) if isinstance(value, dict) else value
 
     @staticmethod
     def get_students():
-        return FirebaseManager._cached_db.get('students', {})
+        return FirebaseManager._collection('students')
+
+    STUDENT_LOOKUP_TTL = 60   # ثوانٍ يبقى فيها سجل طالب تم جلبه صالحاً لمحاولات الدخول التالية
+    STUDENT_LOOKUP_SIZE = 16
+    _student_lookups = OrderedDict()   # code -> (expires_at, record)
+
+    @staticmethod
+    def _forget_lookups(paths):
+        """ أي تغيير لسجل طالب (كلمة مرور جديدة مثلاً) يُبطل نسخته المجلوبة للدخول """
+        lookups = FirebaseManager._student_lookups
+        for path in paths:
+            keys = split_path(path)
+            if not keys or (keys[0] == 'students' and len(keys) == 1):
+                lookups.clear()
+            elif keys[0] == 'students':
+                lookups.pop(keys[1], None)
+
+    @staticmethod
+    def lookup_student(code, on_done):
+        """ جلب سجل طالب واحد (students/{code}) للدخول بدون انتظار أي مزامنة.
+            on_done(record, source): source = 'cache' أو 'server' أو 'snapshot' عند عدم الاتصال، و record = None إذا لم يوجد """
+        lookups = FirebaseManager._student_lookups
+        cached = lookups.get(code)
+        if cached and cached[0] > time.monotonic():
+            return on_done(cached[1], 'cache')
+
+        def success(res):
+            record = res if isinstance(res, dict) else None
+            lookups[code] = (time.monotonic() + FirebaseManager.STUDENT_LOOKUP_TTL, record)
+            lookups.move_to_end(code)
+            while len(lookups) > FirebaseManager.STUDENT_LOOKUP_SIZE:
+                lookups.popitem(last=False)
+            on_done(record, 'server')
+
+        def failure(err):
+            # بدون اتصال: النسخة المحلية تحتوي سجلات من دخلوا من هذا الجهاز
+            print(f"Student lookup failed ({err}), using local snapshot")
+            on_done(FirebaseManager.get_students().get(code), 'snapshot')
+
+        FirebaseManager._call_api(f"students/{code}", "GET", priority=PRIORITY_INTERACTIVE,
+                                  on_success=success, on_failure=failure)
 
     @staticmethod
-    def save_student(code, student_data):
-        FirebaseManager._cached_db.setdefault('students', {})[code] = student_data
-        FirebaseManager._call_api(f"students/{code}", "PUT", data=student_data)
+    def save_student(code, student_data, on_done=None):
+        FirebaseManager._write({f"students/{code}": student_data}, on_done)
         return True
 
+    IMPORT_BATCH = 250   # طالب في كل كتابة متعددة المسارات
+
     @staticmethod
-    def delete_student(code):
+    def import_students(path, on_progress=None, on_done=None, batch_size=None):
+        """ استيراد طلاب من CSV (الاسم، الكود، كلمة المرور): دفعة كل إطار حتى لا تتجمد الواجهة،
+            وكل دفعة كتابة واحدة بدلاً من طلب لكل طالب. on_progress(report) و on_done(report) """
+        f, size = open_csv(path)
+        importer = StudentImporter(f, FirebaseManager.get_students(), FirebaseManager.get_pending_requests(),
+                                   batch_size or FirebaseManager.IMPORT_BATCH, size)
+        report = importer.report
+        state = {'unsettled': 0}
+
+        def settle():
+            if importer.done and state['unsettled'] == 0 and on_done: on_done(report)
+
+        def batch_done(count, ok):
+            state['unsettled'] -= 1
+            if ok: report.confirmed += count
+            if on_progress: on_progress(report)
+            settle()
+
+        def step(dt):
+            updates = importer.next_batch()
+            if updates:
+                state['unsettled'] += 1
+                FirebaseManager._write(updates, partial(batch_done, len(updates)))
+                FirebaseManager.flush_writes()
+            if on_progress: on_progress(report)
+            if importer.done:
+                f.close()
+                settle()
+            else:
+                Clock.schedule_once(step)
+
+        Clock.schedule_once(step)
+        return report
+
+    @staticmethod
+    def delete_student(code, on_done=None):
         if code in FirebaseManager._cached_db.get('students', {}):
-            del FirebaseManager._cached_db['students'][code]
-            FirebaseManager._call_api(f"students/{code}", "DELETE")
+            FirebaseManager._write({f"students/{code}": None}, on_done)
             return True
         return False
 
     @staticmethod
     def get_pending_requests():
-        return FirebaseManager._cached_db.get('pending_requests', {})
+        return FirebaseManager._collection('pending_requests')
 
     @staticmethod
-    def submit_registration_request(code, name, password):
+    def submit_registration_request(code, name, password, on_done=None):
         db = FirebaseManager._cached_db
         if code in db.get('students', {}) or code in db.get('pending_requests', {}):
             return False, "موجود مسبقاً"
@@ -80,151 +712,286 @@ class FirebaseManager:
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M'),
             'status': 'pending'
         }
-        db.setdefault('pending_requests', {})[code] = req_data
-        FirebaseManager._call_api(f"pending_requests/{code}", "PUT", data=req_data)
+        FirebaseManager._write({f"pending_requests/{code}": req_data}, on_done)
         return True, "تم الإرسال"
 
     @staticmethod
-    def approve_request(code):
+    def approve_request(code, on_done=None):
+        return FirebaseManager.approve_requests([code], on_done) > 0
+
+    @staticmethod
+    def reject_request(code, on_done=None):
+        return FirebaseManager.reject_requests([code], on_done) > 0
+
+    @staticmethod
+    def approve_requests(codes=None, on_done=None):
+        """ قبول عدة طلبات تسجيل (أو كلها إذا codes = None) في كتابة واحدة. يرجع عدد المقبول.
+            طلب بكود طالب موجود لا يُقبل (يبقى معلقاً للرفض) حتى لا يستبدل كلمة مروره ومواده """
         pending = FirebaseManager._cached_db.get('pending_requests', {})
-        if code in pending:
-            req = pending[code]
-            student_data = {'name': req['name'], 'password': req['password'], 'materials': []}
-            FirebaseManager.save_student(code, student_data)
-            FirebaseManager.reject_request(code) # حذف من المعلق
-            return True
-        return False
+        students = FirebaseManager._cached_db.get('students', {})
+        updates = {}
+        for code in (pending if codes is None else codes):
+            req = pending.get(code)
+            if not req: continue
+            if code in students:
+                print(f"Registration for existing student {code} skipped")
+                continue
+            # إضافة الطالب وحذف الطلب المعلق في نفس التحديث
+            updates[f"students/{code}"] = {'name': req['name'], 'password': req['password'], 'materials': []}
+            updates[f"pending_requests/{code}"] = None
+        if updates: FirebaseManager._write(updates, on_done)
+        return len(updates) // 2
 
     @staticmethod
-    def reject_request(code):
-        if code in FirebaseManager._cached_db.get('pending_requests', {}):
-            del FirebaseManager._cached_db['pending_requests'][code]
-            FirebaseManager._call_api(f"pending_requests/{code}", "DELETE")
-            return True
-        return False
+    def reject_requests(codes=None, on_done=None):
+        """ رفض عدة طلبات تسجيل (أو كلها) في كتابة واحدة. يرجع عدد المرفوض """
+        pending = FirebaseManager._cached_db.get('pending_requests', {})
+        updates = {f"pending_requests/{code}": None for code in (pending if codes is None else codes) if code in pending}
+        if updates: FirebaseManager._write(updates, on_done)
+        return len(updates)
 
     @staticmethod
     def get_pdfs():
-        return FirebaseManager._cached_db.get('pdfs', {})
+        return FirebaseManager._collection('pdfs')
 
     @staticmethod
-    def save_pdf(pdf_id, title, url, requires_approval=True):
+    def save_pdf(pdf_id, title, url, requires_approval=True, on_done=None):
         pdata = {
             'title': title, 'url': url, 'requires_approval': requires_approval,
-            'approved_students': [], 'pending_download_requests': [],
+            'approved_students': {}, 'pending_download_requests': {},
             'upload_time': datetime.now().strftime('%Y-%m-%d %H:%M')
         }
-        FirebaseManager._cached_db.setdefault('pdfs', {})[pdf_id] = pdata
-        FirebaseManager._call_api(f"pdfs/{pdf_id}", "PUT", data=pdata)
+        FirebaseManager._write({f"pdfs/{pdf_id}": pdata}, on_done)
         return True
 
     @staticmethod
-    def delete_pdf(pdf_id):
+    def delete_pdf(pdf_id, on_done=None):
         if pdf_id in FirebaseManager._cached_db.get('pdfs', {}):
-            del FirebaseManager._cached_db['pdfs'][pdf_id]
-            FirebaseManager._call_api(f"pdfs/{pdf_id}", "DELETE")
+            FirebaseManager._write({f"pdfs/{pdf_id}": None}, on_done)
             return True
         return False
 
     @staticmethod
-    def request_pdf_access(pdf_id, student_code):
+    def request_pdf_access(pdf_id, student_code, on_done=None):
         pdfs = FirebaseManager._cached_db.get('pdfs', {})
         if pdf_id not in pdfs: return False, "غير موجود"
+        if FirebaseManager.has_pdf_access(pdf_id, student_code): return True, "مسموح"
         
-        pdf = pdfs[pdf_id]
-        pending = pdf.setdefault('pending_download_requests', [])
-        if student_code not in pending:
-            pending.append(student_code)
-            FirebaseManager._call_api(f"pdfs/{pdf_id}/pending_download_requests", "PUT", data=pending)
+        if not FirebaseManager.is_pdf_access_pending(pdf_id, student_code):
+            FirebaseManager._write(FirebaseManager._access_updates(pdf_id, 'pending_download_requests', add=[student_code]), on_done)
         return False, "تم إرسال الطلب"
 
     @staticmethod
-    def approve_pdf_access(pdf_id, student_code):
-        pdf = FirebaseManager._cached_db.get('pdfs', {}).get(pdf_id)
-        if pdf:
-            approved = pdf.setdefault('approved_students', [])
-            if student_code not in approved: approved.append(student_code)
-            
-            pending = pdf.get('pending_download_requests', [])
-            if student_code in pending: pending.remove(student_code)
-            
-            FirebaseManager._call_api(f"pdfs/{pdf_id}", "PUT", data=pdf)
-            return True
-        return False
+    def approve_pdf_access(pdf_id, student_code, on_done=None):
+        return FirebaseManager.resolve_pdf_requests([(pdf_id, student_code)], True, on_done) > 0
+
+    @staticmethod
+    def resolve_pdf_requests(requests=None, approve=True, on_done=None):
+        """ قبول أو رفض عدة طلبات تحميل [(pdf_id, student_code)] في كتابة واحدة.
+            requests = None يعني كل الطلبات المعلقة. يرجع عدد الطلبات المنفذة """
+        pdfs = FirebaseManager._cached_db.get('pdfs', {})
+        if requests is None:
+            requests = [(r['pdf_id'], r['student_code']) for r in FirebaseManager.get_pdf_download_requests()]
+        by_pdf = OrderedDict()
+        for pid, code in requests:
+            if pid in pdfs: by_pdf.setdefault(pid, []).append(code)
+        updates = {}
+        for pid, codes in by_pdf.items():
+            if approve:
+                updates.update(FirebaseManager._access_updates(pid, 'approved_students', add=codes))
+            updates.update(FirebaseManager._access_updates(pid, 'pending_download_requests', remove=codes))
+        if updates: FirebaseManager._write(updates, on_done)
+        return sum(len(codes) for codes in by_pdf.values())
+
+    @staticmethod
+    def _access_updates(pdf_id, field, add=(), remove=()):
+        """ تحديثات بمفتاح واحد لكل طالب (pdfs/{id}/{field}/{code}: true).
+            إذا كانت القائمة ما زالت بالشكل القديم تُحوّل مفاتيحها معها (بدون استبدال الحقل كاملاً). """
+        current = FirebaseManager.get_pdfs().get(pdf_id, {}).get(field)
+        updates = FirebaseManager._legacy_access_updates(pdf_id, field, current) if is_legacy_list(current) else {}
+        updates.update({f"pdfs/{pdf_id}/{field}/{code}": True for code in add})
+        updates.update({f"pdfs/{pdf_id}/{field}/{code}": None for code in remove})
+        return updates
+
+    @staticmethod
+    def _legacy_access_updates(pdf_id, field, legacy):
+        """ تحويل مصفوفة أكواد إلى {code: true}: مفتاح لكل كود وحذف مواضع المصفوفة القديمة فقط """
+        prefix = f"pdfs/{pdf_id}/{field}"
+        codes = as_keyset(legacy)
+        updates = {f"{prefix}/{i}": None for i, v in enumerate(legacy) if v is not None and str(i) not in codes}
+        updates.update({f"{prefix}/{code}": True for code in codes})
+        return updates
+
+    @staticmethod
+    def migrate_pdf_access_schema(on_done=None):
+        """ تحويل قوائم الصلاحيات القديمة (مصفوفات أكواد) إلى خرائط {code: true}.
+            يُستدعى بعد لقطة مؤكدة من السيرفر (when_confirmed) لا من النسخة المحفوظة. """
+        updates = {}
+        for pid, pdf in FirebaseManager.get_pdfs().items():
+            for field in ('approved_students', 'pending_download_requests'):
+                if is_legacy_list(pdf.get(field)):
+                    updates.update(FirebaseManager._legacy_access_updates(pid, field, pdf[field]))
+        if updates: FirebaseManager._write(updates, on_done)
+        return len(updates)
+
+    @staticmethod
+    def get_pdf_download_requests(pdf_id=None):
+        """ طلبات التحميل المعلقة لكل الملفات أو لملف واحد """
+        pdfs = FirebaseManager.get_pdfs()
+        by_pdf = FirebaseManager._index.pending_by_pdf
+        if pdf_id is not None: by_pdf = {pdf_id: by_pdf.get(pdf_id, {})}
+        return [
+            {'pdf_id': pid, 'pdf_title': pdfs.get(pid, {}).get('title', ''), 'student_code': scode}
+            for pid, codes in by_pdf.items() for scode in codes
+        ]
+
+    @staticmethod
+    def count_pdf_download_requests():
+        return FirebaseManager._index.pending_count
 
     @staticmethod
-    def get_pdf_download_requests():
-        all_reqs = []
-        for pid, pdf in FirebaseManager._cached_db.get('pdfs', {}).items():
-            for scode in pdf.get('pending_download_requests', []):
-                all_reqs.append({'pdf_id': pid, 'pdf_title': pdf['title'], 'student_code': scode})
-        return all_reqs
+    def has_pdf_access(pdf_id, student_code):
+        return FirebaseManager._index.is_approved(pdf_id, student_code)
+
+    @staticmethod
+    def is_pdf_access_pending(pdf_id, student_code):
+        return FirebaseManager._index.is_pending(pdf_id, student_code)
 
     @staticmethod
     def get_subjects():
-        return FirebaseManager._cached_db.get('subjects', {})
+        return FirebaseManager._collection('subjects')
 
     @staticmethod
-    def save_subject(sub_id, name, doctor):
-        s_data = {
-            'name': name, 'doctor': doctor,
-            'pdfs': FirebaseManager._cached_db.get('subjects', {}).get(sub_id, {}).get('pdfs', [])
-        }
-        FirebaseManager._cached_db.setdefault('subjects', {})[sub_id] = s_data
-        FirebaseManager._call_api(f"subjects/{sub_id}", "PUT", data=s_data)
+    def save_subject(sub_id, name, doctor, on_done=None):
+        # كتابة الحقول فقط: قائمة ملفات المادة قد يعدلها مدير آخر في نفس الوقت
+        FirebaseManager._write({f"subjects/{sub_id}/name": name, f"subjects/{sub_id}/doctor": doctor}, on_done)
         return True
 
     @staticmethod
-    def delete_subject(sub_id):
+    def delete_subject(sub_id, on_done=None):
         if sub_id in FirebaseManager._cached_db.get('subjects', {}):
-            del FirebaseManager._cached_db['subjects'][sub_id]
-            FirebaseManager._call_api(f"subjects/{sub_id}", "DELETE")
+            FirebaseManager._write({f"subjects/{sub_id}": None}, on_done)
             return True
         return False
 
     @staticmethod
-    def add_pdf_to_subject(sub_id, pdf_id):
+    def add_pdf_to_subject(sub_id, pdf_id, on_done=None):
         subs = FirebaseManager._cached_db.get('subjects', {})
-        if sub_id in subs:
-            pdfs = subs[sub_id].setdefault('pdfs', [])
-            if pdf_id not in pdfs:
-                pdfs.append(pdf_id)
-                FirebaseManager._call_api(f"subjects/{sub_id}/pdfs", "PUT", data=pdfs)
-                return True
+        if sub_id in subs and pdf_id not in (subs[sub_id].get('pdfs') or []):
+            def add(current):
+                pdfs = list(current or [])
+                if pdf_id not in pdfs: pdfs.append(pdf_id)
+                return pdfs
+            # القائمة مشتركة بين المدراء: إضافة مشروطة بالـ ETag بدلاً من استبدالها كاملة.
+            # لا تُحفظ في سجل الكتابات: بدون اتصال تُلغى محلياً و on_done(False)
+            FirebaseManager.transaction(f"subjects/{sub_id}/pdfs", add,
+                                        on_done and (lambda ok, value: on_done(ok)))
+            return True
         return False
 
+    ANNOUNCEMENTS_PAGE = 10
+
     @staticmethod
-    def get_announcements():
-        return FirebaseManager._cached_db.get('announcements', [])
+    def _time_key(prefix, ts=None):
+        """ مفتاح مرتب زمنياً (الترتيب الأبجدي = الترتيب الزمني) مع لاحقة عشوائية لمنع التصادم """
+        ms = int((ts if ts is not None else datetime.now().timestamp()) * 1000)
+        return f"{prefix}_{ms:013d}_{os.urandom(2).hex()}"
 
     @staticmethod
-    def add_announcement(text):
-        anns = FirebaseManager._cached_db.get('announcements', [])
-        ann_data = {
-            'id': f"ann_{int(datetime.now().timestamp())}",
-            'text': text, 'time': datetime.now().strftime('%Y-%m-%d %H:%M')
-        }
-        anns.insert(0, ann_data)
-        FirebaseManager._cached_db['announcements'] = anns
-        FirebaseManager._call_api("announcements", "PUT", data=anns)
+    def _announcements_map():
+        anns = FirebaseManager._cached_db.get('announcements', {})
+        if isinstance(anns, list):
+            # الشكل القديم: قائمة الأحدث أولاً
+            return {f"{len(anns) - i:08d}": a for i, a in enumerate(anns) if a}
+        return anns
+
+    @staticmethod
+    def get_announcements(limit=None, before=None):
+        """ الإعلانات من الأحدث للأقدم. limit/before لقراءة صفحة واحدة فقط (before = مفتاح آخر إعلان معروض) """
+        anns = FirebaseManager._announcements_map()
+        keys = [k for k in anns if before is None or k < before]
+        keys = heapq.nlargest(limit, keys) if limit else sorted(keys, reverse=True)
+        return [dict(anns[k], key=k) for k in keys]
+
+    @staticmethod
+    def fetch_announcements(limit=None, before=None, on_done=None, on_failure=None):
+        """ تحميل صفحة أقدم من السيرفر (orderBy=$key + limitToLast + endAt) ودمجها في النسخة المحلية.
+            عند فشل الطلب on_failure(err) بدلاً من on_done، فلا تُفهم صفحة فارغة على أنها نهاية الإعلانات """
+        limit = limit or FirebaseManager.ANNOUNCEMENTS_PAGE
+        params = {'orderBy': '"$key"', 'limitToLast': limit + (1 if before else 0)}
+        if before: params['endAt'] = f'"{before}"'
+
+        def success(res):
+            page = {k: v for k, v in (res or {}).items() if k != before} if isinstance(res, dict) else {}
+            if page and isinstance(FirebaseManager._cached_db.get('announcements', {}), dict):
+                FirebaseManager._apply_delta('patch', 'announcements', page)
+            if on_done: on_done(FirebaseManager.get_announcements(limit, before))
+
+        FirebaseManager._call_api(
+            "announcements", "GET", params=params,
+            on_success=success, on_failure=on_failure
+        )
+
+    @staticmethod
+    def add_announcement(text, on_done=None):
+        now = datetime.now()
+        key = FirebaseManager._time_key('ann', now.timestamp())
+        ann_data = {'id': key, 'text': text, 'time': now.strftime('%Y-%m-%d %H:%M')}
+        if isinstance(FirebaseManager._cached_db.get('announcements'), list):
+            # القائمة القديمة تُحوّل مع الإضافة في كتابة مشروطة بقيمة السيرفر الحالية
+            FirebaseManager.transaction(
+                "announcements", lambda anns: dict(FirebaseManager._keyed_announcements(anns), **{key: ann_data}),
+                on_done and (lambda ok, value: on_done(ok))
+            )
+            return True
+        # إضافة عنصر واحد فقط بدلاً من رفع قائمة الإعلانات كاملة
+        FirebaseManager._write({f"announcements/{key}": ann_data}, on_done)
         return True
 
+    @staticmethod
+    def _keyed_announcements(anns):
+        """ الإعلانات بمفاتيح زمنية: القائمة القديمة تُحوّل والخريطة تبقى كما هي """
+        if not isinstance(anns, list): return anns or {}
+        keyed = {}
+        for a in anns:
+            if not isinstance(a, dict): continue
+            try:
+                ts = datetime.strptime(a.get('time', ''), '%Y-%m-%d %H:%M').timestamp()
+            except ValueError:
+                ts = 0
+            old_id = str(a.get('id', ''))
+            if old_id.startswith('ann_') and old_id[4:].isdigit(): ts = int(old_id[4:])
+            key = FirebaseManager._time_key('ann', ts)
+            keyed[key] = dict(a, id=key)
+        return keyed
+
+    @staticmethod
+    def migrate_announcements_schema(on_done=None):
+        """ تحويل قائمة الإعلانات القديمة إلى عناصر بمفاتيح زمنية.
+            يُستدعى بعد لقطة مؤكدة من السيرفر (when_confirmed)، والكتابة مشروطة بـ ETag
+            فلا تستبدل إعلانات لم تصل للنسخة المحلية بعد. """
+        anns = FirebaseManager._cached_db.get('announcements')
+        if not isinstance(anns, list): return 0
+        FirebaseManager.transaction(
+            "announcements", lambda current: FirebaseManager._keyed_announcements(current) or None,
+            on_done and (lambda ok, value: on_done(ok))
+        )
+        return len(anns)
+
     @staticmethod
     def get_admin_settings():
-        return FirebaseManager._cached_db.get('admin_settings', {'center_name': 'MyStudent Center', 'theme': 'dark'})
+        return FirebaseManager._collection('admin_settings', {'center_name': 'MyStudent Center', 'theme': 'dark'})
 
     @staticmethod
-    def save_admin_settings(settings):
-        FirebaseManager._cached_db['admin_settings'] = settings
-        FirebaseManager._call_api("admin_settings", "PUT", data=settings)
+    def save_admin_settings(settings, on_done=None):
+        FirebaseManager._write({"admin_settings": settings}, on_done)
         return True
 
     @staticmethod
-    def change_password(code, new_password):
+    def change_password(code, new_password, on_done=None):
         students = FirebaseManager._cached_db.get('students', {})
         if code in students:
-            students[code]['password'] = new_password
-            FirebaseManager._call_api(f"students/{code}/password", "PUT", data=new_password)
+            FirebaseManager._write({f"students/{code}/password": new_password}, on_done)
             return True
         return False
 
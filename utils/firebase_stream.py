@@ -0,0 +1,208 @@
+# utils/firebase_stream.py - البث اللحظي من Firebase (REST Streaming / text/event-stream)
+import json
+import socket
+import threading
+from collections import OrderedDict
+import urllib.request
+from kivy.clock import Clock
+
+
+def split_path(path):
+    """ تحويل مسار Firebase مثل /students/123 إلى قائمة مفاتيح """
+    return [k for k in str(path or '').strip('/').split('/') if k]
+
+
+def _child(node, key):
+    if isinstance(node, dict):
+        return node.get(key)
+    if isinstance(node, list) and key.isdigit() and int(key) < len(node):
+        return node[int(key)]
+    return None
+
+
+def _list_key(node, key):
+    # مثل Firebase: المفاتيح الرقمية البعيدة (أكواد الطلاب مثلاً) تحوّل المصفوفة إلى خريطة
+    return isinstance(node, list) and key.isdigit() and int(key) <= 2 * len(node)
+
+
+def _set_in(node, keys, value):
+    key, rest = keys[0], keys[1:]
+    child = _set_in(_child(node, key), rest, value) if rest else value
+
+    # القوائم (مثل الإعلانات القديمة) تبقى قوائم إذا كان المفتاح رقماً قريباً من طولها
+    if _list_key(node, key):
+        node = list(node)
+        idx = int(key)
+        if child is None:
+            if idx < len(node): node[idx] = None
+        else:
+            node.extend([None] * (idx + 1 - len(node)))
+            node[idx] = child
+        while node and node[-1] is None:
+            node.pop()
+        return node or None
+
+    if isinstance(node, list):
+        node = {str(i): v for i, v in enumerate(node) if v is not None}
+    node = dict(node) if isinstance(node, dict) else {}
+    if child is None:
+        node.pop(key, None)
+    else:
+        node[key] = child
+    # Firebase لا يحتفظ بالعقد الفارغة
+    return node or None
+
+
+def get_path(root, path):
+    """ قراءة القيمة في مسار داخل الشجرة (None إذا لم يوجد) """
+    node = root
+    for key in split_path(path):
+        node = _child(node, key)
+        if node is None: return None
+    return node
+
+
+def set_path(root, path, value):
+    """ وضع قيمة في مسار داخل الشجرة (None = حذف) وإرجاع الجذر الجديد.
+        يتم نسخ العقد الواقعة على المسار فقط، وتبقى باقي الشجرة مشتركة. """
+    keys = split_path(path)
+    if not keys:
+        return value if value is not None else {}
+    return _set_in(root, keys, value) or {}
+
+
+def _set_many(node, entries):
+    """ مثل _set_in لعدة مسارات [(keys, value)] بالترتيب، مع نسخ كل عقدة متأثرة مرة واحدة فقط """
+    groups = OrderedDict()
+    for keys, value in entries:
+        groups.setdefault(keys[0], []).append((keys[1:], value))
+
+    as_list = all(_list_key(node, k) for k in groups)
+    if as_list:
+        node = list(node)
+    else:
+        if isinstance(node, list):
+            node = {str(i): v for i, v in enumerate(node) if v is not None}
+        node = dict(node) if isinstance(node, dict) else {}
+
+    for key, items in groups.items():
+        child, deeper = _child(node, key), []
+        for rest, value in items:
+            if rest:
+                deeper.append((rest, value))
+                continue
+            if deeper: child, deeper = _set_many(child, deeper), []
+            child = value
+        if deeper: child = _set_many(child, deeper)
+        if as_list:
+            idx = int(key)
+            if child is None:
+                if idx < len(node): node[idx] = None
+            else:
+                node.extend([None] * (idx + 1 - len(node)))
+                node[idx] = child
+        elif child is None:
+            node.pop(key, None)
+        else:
+            node[key] = child
+    if as_list:
+        while node and node[-1] is None:
+            node.pop()
+    return node or None
+
+
+def apply_event(root, event, path, data):
+    """ تطبيق حدث put أو patch على الشجرة وإرجاع الجذر الجديد """
+    if event == 'put':
+        return set_path(root, path, data)
+    if event == 'patch':
+        base = split_path(path)
+        entries = [(base + split_path(key), value) for key, value in (data or {}).items()]
+        if any(not keys for keys, _ in entries):
+            # تحديث يستبدل الجذر نفسه: نطبقه بالترتيب
+            for keys, value in entries:
+                root = set_path(root, '/'.join(keys), value)
+            return root
+        return (_set_many(root, entries) if entries else root) or {}
+    return root
+
+
+def iter_events(lines):
+    """ قراءة أحداث SSE (event/data) من مصدر أسطر بايتات أو نصوص """
+    event, data = None, []
+    for raw in lines:
+        line = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+        line = line.rstrip('\r\n')
+        if not line:
+            if event:
+                text = '\n'.join(data)
+                try:
+                    payload = json.loads(text) if text else None
+                except ValueError:
+                    payload = text
+                yield event, payload
+            event, data = None, []
+        elif line.startswith(':'):
+            continue
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].lstrip())
+
+
+class FirebaseStream:
+    """ اتصال بث مستمر مع إعادة الاتصال التلقائي.
+        الأحداث تُمرر إلى on_event(event, payload) على خيط Kivy الرئيسي. """
+
+    RECONNECT_DELAY = 2
+    MAX_RECONNECT_DELAY = 60
+    # Firebase يرسل keep-alive كل 30 ثانية، فأي صمت أطول يعني اتصالاً ميتاً
+    READ_TIMEOUT = 65
+
+    def __init__(self, url, on_event, dispatch=None):
+        self.url = url
+        self.on_event = on_event
+        # dispatch مخصص يسمح بتشغيل البث خارج حلقة Kivy (مثلاً مع خادم اختبار محلي)
+        self.dispatch = dispatch or (lambda fn, *args: Clock.schedule_once(lambda dt: fn(*args)))
+        self._stop = threading.Event()
+        self._thread = None
+        self._resp = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running: return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='FirebaseStream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        # إغلاق المقبس مباشرة يوقظ خيط القراءة (resp.close() قد ينتظر نفس القفل الذي يحجزه الخيط)
+        sock = getattr(getattr(getattr(self._resp, 'fp', None), 'raw', None), '_sock', None)
+        if sock is not None:
+            try: sock.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+
+    def _run(self):
+        delay = self.RECONNECT_DELAY
+        while not self._stop.is_set():
+            try:
+                req = urllib.request.Request(self.url, headers={'Accept': 'text/event-stream'})
+                with urllib.request.urlopen(req, timeout=self.READ_TIMEOUT) as resp:
+                    self._resp = resp
+                    delay = self.RECONNECT_DELAY
+                    for event, payload in iter_events(resp):
+                        if self._stop.is_set(): return
+                        if event == 'keep-alive': continue
+                        self.dispatch(self.on_event, event, payload)
+                        if event in ('cancel', 'auth_revoked'): break
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"Stream Error: {e}")
+            finally:
+                self._resp = None
+            if self._stop.wait(delay): break
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
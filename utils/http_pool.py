@@ -0,0 +1,176 @@
+# utils/http_pool.py - مجموعة خيوط ثابتة للاتصال بالسيرفر مع إعادة استخدام الاتصالات (keep-alive)
+import http.client
+import itertools
+import json
+import queue
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit, urlencode, quote
+from kivy.clock import Clock
+from utils.retry_policy import RetryPolicy, CircuitBreaker, TransportMetrics
+
+PRIORITY_INTERACTIVE = 0   # قراءات يطلبها المستخدم مباشرة
+PRIORITY_BACKGROUND = 10   # كتابات ومزامنة في الخلفية
+
+
+def error_status(error):
+    """ رقم حالة HTTP من رسالة الفشل ("HTTP 401: ...")، أو None لأخطاء الشبكة والمهلة """
+    if isinstance(error, str) and error.startswith('HTTP ') and error[5:8].isdigit():
+        return int(error[5:8])
+    return None
+
+
+def _ssl_context():
+    try:
+        import certifi
+        return ssl.create_default_context(cafile=certifi.where())
+    except ImportError:
+        return ssl.create_default_context()
+
+
+class _Job:
+    __slots__ = ('method', 'url', 'body', 'headers', 'on_success', 'on_failure', 'on_response',
+                 'priority', 'attempt', 'started')
+
+    def __init__(self, method, url, body, headers, on_success, on_failure, on_response, priority):
+        self.method, self.url, self.body, self.headers = method, url, body, headers
+        self.on_success, self.on_failure, self.on_response = on_success, on_failure, on_response
+        self.priority, self.attempt, self.started = priority, 0, time.monotonic()
+
+
+class HttpPool:
+    """ عدد ثابت من الخيوط، لكل خيط اتصال دائم بالسيرفر (بدون مصافحة TLS لكل طلب).
+        الطلبات تنتظر في طابور أولويات، والنتائج تُعاد على خيط Kivy الرئيسي.
+        أخطاء الشبكة و 5xx يعاد إرسالها حسب RetryPolicy، وقاطع الدائرة يوقف الإرسال عند تعطل السيرفر. """
+
+    def __init__(self, base_url, size=4, timeout=20, dispatch=None, policy=None, breaker=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path if parts.path.endswith('/') else parts.path + '/'
+        self.timeout = timeout
+        self.dispatch = dispatch or (lambda fn, *args: Clock.schedule_once(lambda dt: fn(*args)))
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = TransportMetrics()
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._ssl = _ssl_context() if self.scheme == 'https' else None
+        self._threads = []
+        for i in range(size):
+            t = threading.Thread(target=self._worker, name=f'HttpPool-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def request(self, method, path, data=None, params=None, headers=None,
+                on_success=None, on_failure=None, priority=PRIORITY_BACKGROUND, on_response=None):
+        """ إضافة طلب للطابور. on_success(result) و on_failure(error) تُنفذان على الخيط الرئيسي.
+            on_response(status, result, etag) إن وُجدت تستقبل أي رد HTTP (مثل 304 و 412) بدلاً من on_success """
+        self.metrics.incr('requests')
+        job = _Job(method, None, None, dict(headers or {}), on_success, on_failure, on_response, priority)
+        try:
+            # المسار قد يحتوي أحرفاً غير ASCII (أكواد بالعربية) فيُرمّز في الرابط
+            job.url = f"{self.prefix}{quote(path, safe='/')}.json"
+            if params: job.url += '?' + urlencode(params)
+            job.body = json.dumps(data) if data is not None else None
+        except (TypeError, ValueError) as e:
+            return self._fail(job, str(e))
+        self._enqueue(job)
+
+    def _enqueue(self, job):
+        self._queue.put((job.priority, next(self._seq), job))
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put((float('inf'), next(self._seq), None))
+
+    def _connect(self):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self._ssl)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, conn, job):
+        """ إرسال الطلب مرة واحدة (مع إعادة فتح الاتصال إذا أغلقه السيرفر). يرجع (conn, status, etag, raw, error) """
+        error = None
+        for attempt in range(2):
+            try:
+                conn = conn or self._connect()
+                conn.request(job.method, job.url, body=job.body, headers=job.headers)
+                resp = conn.getresponse()
+                status, etag, raw = resp.status, resp.getheader('ETag'), resp.read()
+                if resp.will_close:
+                    conn.close(); conn = None
+                return conn, status, etag, raw, None
+            except (http.client.HTTPException, OSError) as e:
+                if conn: conn.close()
+                conn, error = None, str(e)
+        return conn, None, None, b'', error
+
+    def _worker(self):
+        conn = None
+        while True:
+            _, _, job = self._queue.get()
+            if job is None: break
+            try:
+                conn = self._process(conn, job)
+            except Exception as e:
+                # أي خطأ غير متوقع ينهي هذا الطلب فقط: الخيط يبقى يعمل والمستدعي يستلم on_failure
+                if conn: conn.close()
+                conn = None
+                self._fail(job, str(e))
+
+    def _process(self, conn, job):
+        """ تنفيذ طلب واحد (مع جدولة إعادة المحاولة) وإرجاع الاتصال لاستخدامه في الطلب التالي """
+        if job.body is not None: job.headers.setdefault('Content-Type', 'application/json')
+
+        if time.monotonic() - job.started > self.policy.deadline:
+            self._fail(job, 'Deadline exceeded', 'deadline_exceeded')
+            return conn
+        if not self.breaker.allow():
+            self._fail(job, f'Circuit open for {self.host}', 'circuit_rejected')
+            return conn
+
+        sent_at = time.monotonic()
+        conn, status, etag, raw, error = self._send(conn, job)
+        self.metrics.observe(time.monotonic() - sent_at)
+
+        if error is None and status < 500 and status != 429:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+            self.metrics.incr('network_errors' if error else 'server_errors')
+            delay = self.policy.next_delay(job.attempt, job.started, status)
+            if delay is not None:
+                # إعادة الجدولة بمؤقت حتى لا يبقى الخيط محجوزاً أثناء الانتظار
+                job.attempt += 1
+                self.metrics.incr('retries')
+                timer = threading.Timer(delay, self._enqueue, (job,))
+                timer.daemon = True
+                timer.start()
+                return conn
+
+        result = None
+        if error is None:
+            try: result = json.loads(raw) if raw else None
+            except ValueError as e: error = f"Bad JSON: {e}"
+        if error is None and job.on_response and status < 500:
+            self.metrics.incr('successes')
+            self.dispatch(job.on_response, status, result, etag)
+            return conn
+        if error is None and not 200 <= status < 300:
+            error = f"HTTP {status}: {raw[:200].decode('utf-8', 'replace')}"
+        if error is None:
+            self.metrics.incr('successes')
+            if job.on_success: self.dispatch(job.on_success, result)
+        else:
+            self._fail(job, error)
+        return conn
+
+    def _fail(self, job, error, counter='failures'):
+        self.metrics.incr(counter)
+        if job.on_failure:
+            self.dispatch(job.on_failure, error)
+        else:
+            self.dispatch(print, f"API Error: {error}")
@@ -0,0 +1,300 @@
+# utils/local_firebase_server.py - سيرفر محلي يحاكي Firebase Realtime Database REST للاختبار والقياس
+#
+# التشغيل:
+#   python -m utils.local_firebase_server --port 8765 --seed local_db.json --latency 0.2 --failure-rate 0.05
+# ثم تشغيل التطبيق مع:
+#   MYSTUDENT_FIREBASE_URL=http://127.0.0.1:8765/ python main.py
+import argparse
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from utils.firebase_stream import get_path, set_path, split_path
+
+_PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+
+def etag_of(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def push_key():
+    """ مفتاح مرتب زمنياً بنفس أسلوب مفاتيح push في Firebase """
+    ms = int(time.time() * 1000)
+    head = ''
+    for _ in range(8):
+        head = _PUSH_CHARS[ms % 64] + head
+        ms //= 64
+    return head + ''.join(random.choice(_PUSH_CHARS) for _ in range(12))
+
+
+def _sort_value(value):
+    # ترتيب Firebase: null ثم false ثم true ثم الأرقام ثم النصوص ثم الكائنات
+    if value is None: return (0, 0)
+    if value is False: return (1, 0)
+    if value is True: return (2, 0)
+    if isinstance(value, (int, float)): return (3, value)
+    if isinstance(value, str): return (4, value)
+    return (5, 0)
+
+
+def run_query(node, params):
+    """ تطبيق orderBy / startAt / endAt / equalTo / limitToFirst / limitToLast """
+    if 'orderBy' not in params:
+        if any(k in params for k in ('limitToFirst', 'limitToLast', 'startAt', 'endAt', 'equalTo')):
+            raise ValueError('orderBy must be defined when other query parameters are defined')
+        return node
+    if isinstance(node, list):
+        node = {str(i): v for i, v in enumerate(node) if v is not None}
+    if not isinstance(node, dict):
+        return node
+    order = json.loads(params['orderBy'])
+    if order == '$key':
+        key_of = lambda kv: (4, kv[0])
+    elif order == '$value':
+        key_of = lambda kv: _sort_value(kv[1])
+    else:
+        key_of = lambda kv: _sort_value(get_path(kv[1], order))
+    items = sorted(node.items(), key=lambda kv: (key_of(kv), kv[0]))
+    for name, keep in (('startAt', lambda a, b: a >= b), ('endAt', lambda a, b: a <= b), ('equalTo', lambda a, b: a == b)):
+        if name in params:
+            bound = _sort_value(json.loads(params[name]))
+            items = [kv for kv in items if keep(key_of(kv), bound)]
+    if 'limitToFirst' in params: items = items[:int(params['limitToFirst'])]
+    if 'limitToLast' in params: items = items[-int(params['limitToLast']):]
+    return dict(items)
+
+
+def shallow(node):
+    if isinstance(node, dict): return {k: True for k in node}
+    if isinstance(node, list): return {str(i): True for i, v in enumerate(node) if v is not None}
+    return node
+
+
+class LocalFirebaseServer:
+    """ سيرفر HTTP محلي يحاكي ما يستخدمه التطبيق من Firebase REST:
+        GET/PUT/PATCH/POST/DELETE، shallow، الاستعلامات، البث، ETag، مع تأخير وأخطاء مصطنعة. """
+
+    KEEP_ALIVE = 30
+
+    def __init__(self, data=None, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0):
+        self.db = data if isinstance(data, dict) else {}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = []          # سجل الطلبات (method, path) للقياس في الاختبارات
+        self._fail_next = 0
+        self._denied = set()        # مسارات ترفض الكتابة (مثل قواعد الأمان في Firebase)
+        self._lock = threading.RLock()
+        self._listeners = []        # [(path, queue)]
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='LocalFirebase', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        for _, q in list(self._listeners): q.put(None)
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def fail_next(self, count=1):
+        """ إجبار الطلبات القادمة على الفشل (503) لاختبار إعادة المحاولة """
+        self._fail_next += count
+
+    def deny_writes(self, path):
+        """ رفض أي كتابة داخل المسار بـ 401 كما تفعل قواعد الأمان، لاختبار الرفض النهائي """
+        self._denied.add('/'.join(split_path(path)))
+
+    def _is_denied(self, path):
+        keys = split_path(path)
+        return any(keys[:len(split_path(d))] == split_path(d) for d in self._denied)
+
+    def get(self, path=''):
+        with self._lock:
+            return get_path(self.db, path)
+
+    # ─── الكتابة وإبلاغ المستمعين ───
+    def _commit(self, changes):
+        """ تطبيق قائمة [(path, value)] ثم إرسال الأحداث للمستمعين المتأثرين """
+        with self._lock:
+            for path, value in changes:
+                self.db = set_path(self.db, path, value)
+            for listen_path, q in list(self._listeners):
+                self._notify(listen_path, q, changes)
+
+    def _notify(self, listen_path, q, changes):
+        base = split_path(listen_path)
+        inside = {}
+        for path, value in changes:
+            keys = split_path(path)
+            if keys[:len(base)] == base:
+                inside['/'.join(keys[len(base):])] = value
+            elif base[:len(keys)] == keys:
+                q.put(('put', {'path': '/', 'data': get_path(self.db, listen_path)}))
+                return
+        if len(inside) == 1:
+            rel, value = next(iter(inside.items()))
+            q.put(('put', {'path': '/' + rel, 'data': value}))
+        elif inside:
+            q.put(('patch', {'path': '/', 'data': inside}))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=None, headers=None):
+                raw = json.dumps(body, ensure_ascii=False).encode('utf-8') if status != 304 else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(raw)))
+                for k, v in (headers or {}).items(): self.send_header(k, v)
+                self.end_headers()
+                if raw: self.wfile.write(raw)
+
+            def _parse(self):
+                parts = urlsplit(self.path)
+                path = unquote(parts.path)
+                if not path.endswith('.json'):
+                    return None, None
+                params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                return path[:-5].strip('/'), params
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length)) if length else None
+
+            def _handle(self):
+                path, params = self._parse()
+                body = self._body()
+                server.requests.append((self.command, path))
+                if server.latency: time.sleep(server.latency)
+                if path is None:
+                    return self._send(404, {'error': 'Not Found'})
+                if server._fail_next > 0 or (server.failure_rate and random.random() < server.failure_rate):
+                    server._fail_next = max(0, server._fail_next - 1)
+                    return self._send(503, {'error': 'Service Unavailable (injected)'})
+                if self.command == 'GET' and 'text/event-stream' in self.headers.get('Accept', ''):
+                    return self._stream(path)
+
+                with server._lock:
+                    current = get_path(server.db, path)
+                    tag = etag_of(current)
+                    want_etag = self.headers.get('X-Firebase-ETag', '').lower() == 'true'
+                    extra = {'ETag': tag} if want_etag else {}
+
+                    if self.command == 'GET':
+                        if self.headers.get('If-None-Match') == tag:
+                            return self._send(304, headers={'ETag': tag})
+                        try:
+                            result = run_query(current, params)
+                        except ValueError as e:
+                            return self._send(400, {'error': str(e)})
+                        if params.get('shallow') == 'true': result = shallow(result)
+                        return self._send(200, result, extra)
+
+                    written = [f"{path}/{k}" for k in body] if self.command == 'PATCH' and isinstance(body, dict) else [path]
+                    if any(server._is_denied(p) for p in written):
+                        return self._send(401, {'error': 'Permission denied'})
+
+                    if_match = self.headers.get('if-match')
+                    if if_match is not None and if_match != tag:
+                        return self._send(412, current, {'ETag': tag})
+
+                    if self.command == 'PUT':
+                        server._commit([(path, body)])
+                        result = body
+                    elif self.command == 'PATCH':
+                        if not isinstance(body, dict):
+                            return self._send(400, {'error': 'Invalid data; couldn\'t parse JSON object.'})
+                        prefix = path + '/' if path else ''
+                        server._commit([(prefix + k, v) for k, v in body.items()])
+                        result = body
+                    elif self.command == 'POST':
+                        key = push_key()
+                        server._commit([(f"{path}/{key}" if path else key, body)])
+                        result = {'name': key}
+                    elif self.command == 'DELETE':
+                        server._commit([(path, None)])
+                        result = None
+                    else:
+                        return self._send(405, {'error': 'Method Not Allowed'})
+                    if want_etag: extra['ETag'] = etag_of(get_path(server.db, path))
+                    return self._send(200, result, extra)
+
+            def _stream(self, path):
+                q = queue.Queue()
+                with server._lock:
+                    server._listeners.append((path, q))
+                    q.put(('put', {'path': '/', 'data': get_path(server.db, path)}))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    while True:
+                        try:
+                            item = q.get(timeout=server.KEEP_ALIVE)
+                        except queue.Empty:
+                            item = ('keep-alive', None)
+                        if item is None: break
+                        event, data = item
+                        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                except OSError:
+                    pass
+                finally:
+                    with server._lock:
+                        server._listeners = [(p, lq) for p, lq in server._listeners if lq is not q]
+
+            do_GET = do_PUT = do_PATCH = do_POST = do_DELETE = _handle
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Firebase Realtime Database REST stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', help='JSON file with initial data (e.g. local_db.json)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    data = {}
+    if args.seed and os.path.exists(args.seed):
+        with open(args.seed, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    server = LocalFirebaseServer(data, args.host, args.port, args.latency, args.failure_rate)
+    print(f"Local Firebase running at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# utils/local_store.py - حفظ نسخة محلية من قاعدة البيانات على الجهاز (تشغيل فوري بدون إنترنت)
+import json
+import os
+from datetime import datetime
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_NAME = 'local_db.json'
+# النسخة المرفقة مع التطبيق تستخدم كبذرة أولى إذا لم توجد نسخة محفوظة
+BUNDLED_SNAPSHOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SNAPSHOT_NAME)
+
+
+def snapshot_path():
+    """ مسار الملف داخل مجلد بيانات التطبيق (قابل للكتابة على أندرويد).
+        يرجع None خارج التطبيق حتى لا يتم الكتابة فوق النسخة المرفقة. """
+    try:
+        from kivy.app import App
+        app = App.get_running_app()
+        if app: return os.path.join(app.user_data_dir, SNAPSHOT_NAME)
+    except Exception:
+        pass
+    return None
+
+
+def load_snapshot(path=None):
+    """ قراءة النسخة المحلية بشكل متزامن. ترجع {} إذا لم توجد أو كانت بإصدار مختلف """
+    for candidate in ([path] if path else [snapshot_path(), BUNDLED_SNAPSHOT]):
+        if not candidate: continue
+        try:
+            with open(candidate, 'r', encoding='utf-8') as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(doc, dict): continue
+        if 'version' not in doc:
+            return doc  # ملف قديم بدون إصدار (مثل local_db.json المرفق)
+        if doc.get('version') == SNAPSHOT_VERSION and isinstance(doc.get('data'), dict):
+            return doc['data']
+    return {}
+
+
+def save_snapshot(db, path=None):
+    """ كتابة ذرية (ملف مؤقت ثم استبدال) حتى لا يتلف الملف عند إغلاق التطبيق فجأة """
+    path = path or snapshot_path()
+    if not path: return False
+    tmp = f"{path}.tmp"
+    doc = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'data': db
+    }
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Snapshot Save Error: {e}")
+        return False
+
+
+DEVICE_STUDENTS_NAME = 'device_students.json'
+
+
+def device_students_path():
+    """ قائمة أكواد من دخلوا من هذا الجهاز، بجانب النسخة المحلية """
+    path = snapshot_path()
+    return os.path.join(os.path.dirname(path), DEVICE_STUDENTS_NAME) if path else None
+
+
+def load_device_students(path=None):
+    path = path or device_students_path()
+    if not path: return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            codes = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [str(c) for c in codes] if isinstance(codes, list) else []
+
+
+def save_device_students(codes, path=None):
+    path = path or device_students_path()
+    if not path: return False
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(list(codes), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"Device Students Save Error: {e}")
+        return False
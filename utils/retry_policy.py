@@ -0,0 +1,103 @@
+# utils/retry_policy.py - سياسة إعادة المحاولة وقاطع الدائرة ومقاييس الاتصال
+import random
+import threading
+import time
+
+
+class RetryPolicy:
+    """ إعادة محاولة محدودة بتأخير أسّي عشوائي (full jitter) ومهلة نهائية لكل طلب.
+        العشوائية تمنع مئات الأجهزة من إعادة المحاولة في نفس اللحظة. """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=8.0, deadline=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def is_retryable(self, status):
+        """ status = None يعني خطأ شبكة أو انتهاء مهلة """
+        return status is None or status in self.RETRY_STATUSES
+
+    def is_permanent(self, status):
+        """ رفض نهائي من السيرفر (صلاحيات أو بيانات غير صالحة): إعادة الإرسال لن تغير النتيجة """
+        return status is not None and 400 <= status < 500 and status != 408 and status not in self.RETRY_STATUSES
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def next_delay(self, attempt, started, status):
+        """ التأخير قبل المحاولة التالية، أو None إذا يجب التوقف """
+        if not self.is_retryable(status) or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay - started > self.deadline:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """ بعد عدد من الفشل المتتالي يتوقف الإرسال للسيرفر فترة (open)،
+        ثم يُسمح بطلب تجريبي واحد (half-open) قبل العودة للوضع الطبيعي. """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=20.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state, self._probe = self.HALF_OPEN, False
+            if self.state == self.CLOSED: return True
+            if self.state == self.HALF_OPEN and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self._failures, self._probe = self.CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state, self._opened_at, self._probe = self.OPEN, time.monotonic(), False
+
+
+class TransportMetrics:
+    """ عدادات بسيطة آمنة بين الخيوط لمراقبة أداء الاتصال.
+        الطلبات المرفوضة محلياً (قاطع الدائرة، المهلة) تُعد في عداداتها فقط ولا تدخل في failures أو زمن الاستجابة """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+            'network_errors': 0, 'server_errors': 0, 'deadline_exceeded': 0, 'circuit_rejected': 0,
+        }
+        self.latency_total = 0.0
+        self.latency_count = 0   # طلبات وصلت للسيرفر فعلاً (بما فيها المحاولات المعادة)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, seconds):
+        with self._lock:
+            self.latency_total += seconds
+            self.latency_count += 1
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counters)
+            done = self.latency_count
+            data['avg_latency_ms'] = round(self.latency_total * 1000 / done, 1) if done else 0.0
+            return data
@@ -0,0 +1,62 @@
+# utils/snapshot_diff.py - مقارنة نسختين من قاعدة البيانات على مستوى السجل (collection/key)
+from collections import namedtuple, OrderedDict
+from utils.firebase_stream import get_path, split_path
+
+Change = namedtuple('Change', 'collection key old new')
+
+
+def _children(node):
+    if isinstance(node, list):
+        return {str(i): v for i, v in enumerate(node) if v is not None}
+    return node if isinstance(node, dict) else {}
+
+
+def differs(old, new):
+    # النسخ على المسار (copy-on-path) يُبقي العقد غير المتغيرة مشتركة، فالمقارنة بالهوية تكفي غالباً
+    return old is not new and old != new
+
+
+def _is_tree(node):
+    return isinstance(node, (dict, list))
+
+
+def diff_records(old_root, new_root, path=''):
+    """ التغييرات داخل المسار path بين شجرتين في مرور واحد:
+        كل سجل (collection/key) يُقارن مرة واحدة، والعقد المشتركة بين النسختين تُتخطى فوراً. """
+    keys = split_path(path)
+    if len(keys) >= 2:
+        coll, key = keys[0], keys[1]
+        old, new = get_path(old_root, f"{coll}/{key}"), get_path(new_root, f"{coll}/{key}")
+        if differs(old, new): yield Change(coll, key, old, new)
+        return
+    if keys:
+        collections = keys
+    else:
+        if old_root is new_root: return
+        old_top, new_top = _children(old_root), _children(new_root)
+        collections = list(new_top) + [c for c in old_top if c not in new_top]
+    for coll in collections:
+        old, new = get_path(old_root, coll), get_path(new_root, coll)
+        if old is new: continue
+        if not _is_tree(old) and not _is_tree(new):
+            # قيمة بسيطة مباشرة تحت الجذر
+            if old != new: yield Change(coll, None, old, new)
+            continue
+        old, new = _children(old), _children(new)
+        for key in list(new) + [k for k in old if k not in new]:
+            if differs(old.get(key), new.get(key)):
+                yield Change(coll, key, old.get(key), new.get(key))
+
+
+def diff_paths(old_root, new_root, paths):
+    """ التغييرات التي سببتها كتابة على المسارات paths (كل سجل يظهر مرة واحدة) """
+    found = OrderedDict()
+    for path in paths:
+        for change in diff_records(old_root, new_root, path):
+            found.setdefault((change.collection, change.key), change)
+    return list(found.values())
+
+
+def record_updates(changes):
+    """ تحويل التغييرات إلى تحديث {path: value} يطبق على مستوى السجل فقط """
+    return {(f"{c.collection}/{c.key}" if c.key is not None else c.collection): c.new for c in changes}
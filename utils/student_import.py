@@ -0,0 +1,122 @@
+# utils/student_import.py - استيراد الطلاب من ملف CSV (قراءة تدريجية + تحقق + دفعات كتابة)
+import csv
+import os
+
+# أسماء الأعمدة المقبولة في السطر الأول؛ بدونها يُفترض الترتيب: الاسم، الكود، كلمة المرور
+HEADER_ALIASES = {
+    'name': ('name', 'student', 'الاسم', 'اسم الطالب'),
+    'code': ('code', 'id', 'الكود', 'كود الطالب'),
+    'password': ('password', 'pass', 'كلمة المرور', 'الرمز'),
+}
+MIN_PASSWORD = 4
+# أحرف لا يقبلها Firebase في المفاتيح
+FORBIDDEN_KEY_CHARS = set('.#$[]/')
+
+REASONS = {
+    'missing': 'حقل ناقص',
+    'short_password': 'كلمة مرور قصيرة',
+    'bad_code': 'كود غير صالح',
+    'duplicate_student': 'طالب موجود مسبقاً',
+    'duplicate_pending': 'لديه طلب تسجيل معلق',
+    'duplicate_file': 'مكرر داخل الملف',
+    'invalid_file': 'ملف غير صالح (يجب أن يكون CSV بترميز UTF-8)',
+}
+
+
+class ImportReport:
+    """ نتيجة الاستيراد حتى الآن (تُحدّث مع كل دفعة) """
+
+    def __init__(self):
+        self.rows = 0          # صفوف البيانات المقروءة
+        self.imported = 0      # صفوف صالحة أضيفت للنسخة المحلية وأُرسلت
+        self.confirmed = 0     # منها ما أكده السيرفر
+        self.errors = []       # [(line, code, reason)]
+        self.fraction = 0.0    # نسبة ما قُرئ من الملف
+
+    @property
+    def duplicates(self):
+        return [e for e in self.errors if e[2].startswith('duplicate')]
+
+    def summary(self, limit=10):
+        lines = [f"{line}: {code or '-'} - {REASONS.get(reason, reason)}" for line, code, reason in self.errors[:limit]]
+        if len(self.errors) > limit: lines.append(f"... (+{len(self.errors) - limit})")
+        return lines
+
+
+class StudentImporter:
+    """ يقرأ ملف CSV صفاً بصف (بدون تحميله كاملاً في الذاكرة) ويُرجع الصفوف الصالحة
+        كدفعات {students/{code}: data} جاهزة لكتابة واحدة متعددة المسارات. """
+
+    def __init__(self, lines, students=None, pending=None, batch_size=250, total_size=None):
+        self._consumed = 0
+        self._total = total_size
+        self._reader = csv.reader(self._count(lines))
+        self._columns = None
+        self.students = students or {}
+        self.pending = pending or {}
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self.done = False
+        self._seen = set()
+
+    def _count(self, lines):
+        for line in lines:
+            self._consumed += len(line.encode('utf-8'))
+            yield line
+
+    def _detect_columns(self, row):
+        cells = [c.strip().lower() for c in row]
+        found = {}
+        for field, aliases in HEADER_ALIASES.items():
+            for i, cell in enumerate(cells):
+                if cell in aliases: found[field] = i
+        if len(found) == len(HEADER_ALIASES):
+            self._columns = found
+            return True   # سطر عناوين
+        self._columns = {'name': 0, 'code': 1, 'password': 2}
+        return False
+
+    def validate(self, row):
+        """ ترجع (code, data, None) للصف الصالح أو (code, None, reason) """
+        cols = self._columns
+        cell = lambda f: row[cols[f]].strip() if cols[f] < len(row) else ''
+        name, code, password = cell('name'), cell('code'), cell('password')
+        if not name or not code or not password: return code, None, 'missing'
+        if any(ch in FORBIDDEN_KEY_CHARS for ch in code): return code, None, 'bad_code'
+        if len(password) < MIN_PASSWORD: return code, None, 'short_password'
+        if code in self._seen: return code, None, 'duplicate_file'
+        if code in self.students: return code, None, 'duplicate_student'
+        if code in self.pending: return code, None, 'duplicate_pending'
+        return code, {'name': name, 'password': password, 'materials': []}, None
+
+    def next_batch(self):
+        """ قراءة الصفوف حتى اكتمال دفعة أو نهاية الملف """
+        updates = {}
+        try:
+            for row in self._reader:
+                line = self._reader.line_num
+                if not any(c.strip() for c in row): continue
+                if self._columns is None and self._detect_columns(row): continue
+                self.report.rows += 1
+                code, data, reason = self.validate(row)
+                if reason:
+                    self.report.errors.append((line, code, reason))
+                    continue
+                self._seen.add(code)
+                updates[f"students/{code}"] = data
+                if len(updates) >= self.batch_size: break
+            else:
+                self.done = True
+        except (csv.Error, UnicodeDecodeError) as e:
+            # ملف تالف أو بترميز غير UTF-8: نكتفي بما قُرئ قبله
+            self.report.errors.append((self._reader.line_num + 1, '', 'invalid_file'))
+            print(f"CSV Import Error: {e}")
+            self.done = True
+        self.report.imported += len(updates)
+        if self._total: self.report.fraction = 1.0 if self.done else min(1.0, self._consumed / self._total)
+        return updates
+
+
+def open_csv(path):
+    """ فتح الملف للقراءة التدريجية (utf-8-sig يتجاهل BOM الذي يضيفه Excel). يرجع (file, size) """
+    return open(path, 'r', encoding='utf-8-sig', newline=''), os.path.getsize(path)
@@ -0,0 +1,40 @@
+# utils/tab_cache.py - الاحتفاظ بواجهات التبويبات بعد بنائها بدلاً من إعادة بنائها عند كل تنقل
+from collections import OrderedDict
+
+
+class TabCache:
+    """ شجرة الواجهة لكل تبويب تُبنى مرة واحدة وتبقى (LRU بعدد محدود)،
+        وتُحذف فقط عند تغير المجموعات التي يعتمد عليها التبويب. """
+
+    def __init__(self, build, depends=None, size=3, on_drop=None):
+        self._build = build             # build(tab) -> widget
+        self._depends = depends or {}   # {tab: (collections,)}
+        self.size = size
+        self._on_drop = on_drop         # on_drop(tab, widget) لإعادة البطاقات لمخزنها
+        self._views = OrderedDict()
+
+    def get(self, tab):
+        """ يرجع (widget, built) حيث built = True إذا بُني الآن """
+        view = self._views.pop(tab, None)
+        built = view is None
+        if built: view = self._build(tab)
+        self._views[tab] = view
+        while len(self._views) > self.size:
+            self._drop(next(iter(self._views)))
+        return view, built
+
+    def _drop(self, tab):
+        view = self._views.pop(tab)
+        if self._on_drop: self._on_drop(tab, view)
+
+    def invalidate(self, collections=None, keep=None):
+        """ حذف التبويبات المعتمدة على collections (None = كل التبويبات).
+            keep: التبويب الظاهر الذي يحدّث نفسه في مكانه """
+        changed = None if collections is None else set(collections)
+        for tab in list(self._views):
+            if tab == keep: continue
+            if changed is None or changed & set(self._depends.get(tab, ())):
+                self._drop(tab)
+
+    def __contains__(self, tab):
+        return tab in self._views
@@ -0,0 +1,28 @@
+# utils/widget_pool.py - إعادة استخدام بطاقات الواجهة بدلاً من إنشائها وحذفها عند كل تحديث
+class WidgetPool:
+    """ مخزن نسخ جاهزة من نوع بطاقة واحد. acquire يربط بيانات جديدة بنسخة موجودة
+        (bind_data) و release يعيدها للمخزن بعد إزالتها من الواجهة.
+        الرسم (Color/RoundedRectangle) والربط (bind) يُنشآن مرة واحدة لكل نسخة فقط. """
+
+    def __init__(self, factory, limit=64):
+        self._factory = factory
+        self._free = []
+        self.limit = limit
+
+    def acquire(self, *args, **kwargs):
+        widget = self._free.pop() if self._free else self._factory()
+        widget.bind_data(*args, **kwargs)
+        return widget
+
+    def release(self, widget):
+        if widget.parent is not None:
+            widget.parent.remove_widget(widget)
+        if len(self._free) < self.limit and widget not in self._free:
+            self._free.append(widget)
+
+    def release_all(self, widgets):
+        for widget in list(widgets):
+            self.release(widget)
+
+    def __len__(self):
+        return len(self._free)
@@ -0,0 +1,70 @@
+# utils/write_buffer.py - تجميع الكتابات وإرسالها كطلب PATCH واحد متعدد المسارات
+import threading
+from kivy.clock import Clock
+from utils.firebase_stream import set_path, split_path
+
+
+class WriteBuffer:
+    """ يجمع الكتابات خلال نافذة زمنية قصيرة ثم يرسلها دفعة واحدة.
+        Firebase يطبق الـ PATCH متعدد المسارات كعملية واحدة (كلها أو لا شيء). """
+
+    def __init__(self, send, window=0.3):
+        # send(updates, on_success, on_failure) يرسل الدفعة فعلياً
+        self.send = send
+        self.window = window
+        self._updates = {}
+        self._callbacks = []
+        self._error_callbacks = []
+        self._prefixes = set()
+        self._trigger = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._updates)
+
+    def add(self, updates, on_done=None, on_error=None):
+        """ إضافة عملية منطقية (عدة مسارات) مع دالة إكمال on_done(ok).
+            on_error(error) تستقبل سبب فشل الدفعة قبل on_done(False) """
+        with self._lock:
+            for path, value in updates.items():
+                self._merge('/'.join(split_path(path)), value)
+            if on_done: self._callbacks.append(on_done)
+            if on_error: self._error_callbacks.append(on_error)
+            if self._trigger is None:
+                self._trigger = Clock.create_trigger(lambda dt: self.flush(), self.window)
+        self._trigger()
+
+    def _merge(self, path, value):
+        # Firebase يرفض دفعة فيها مسار وأحد أبنائه، لذلك ندمجهما هنا
+        keys = path.split('/')
+        for i in range(1, len(keys)):
+            parent = '/'.join(keys[:i])
+            if parent in self._updates:
+                rest = '/'.join(keys[i:])
+                self._updates[parent] = set_path(self._updates[parent] or {}, rest, value) or None
+                return
+        if path in self._prefixes:
+            for queued in [p for p in self._updates if p.startswith(path + '/')]:
+                del self._updates[queued]
+        self._updates[path] = value
+        for i in range(1, len(keys)):
+            self._prefixes.add('/'.join(keys[:i]))
+
+    def flush(self, on_done=None):
+        """ إرسال كل ما تم تجميعه الآن """
+        with self._lock:
+            if self._trigger is not None: self._trigger.cancel()
+            if on_done: self._callbacks.append(on_done)
+            updates, callbacks, error_callbacks = self._updates, self._callbacks, self._error_callbacks
+            self._updates, self._callbacks, self._error_callbacks, self._prefixes = {}, [], [], set()
+        if not updates:
+            for cb in callbacks: cb(True)
+            return
+
+        def done(ok, error=None):
+            calls = [] if ok else [(cb, error) for cb in error_callbacks]
+            for cb, arg in calls + [(cb, ok) for cb in callbacks]:
+                try: cb(arg)
+                except Exception as e: print(f"Write Callback Error: {e}")
+
+        self.send(updates, lambda res: done(True), lambda err: done(False, err))
@@ -0,0 +1,109 @@
+# utils/write_journal.py - سجل دائم للكتابات غير المؤكدة (العمل بدون إنترنت بدون فقدان بيانات)
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+JOURNAL_NAME = 'write_journal.log'
+
+
+def journal_path():
+    """ مسار السجل داخل مجلد بيانات التطبيق، أو None خارج التطبيق (سجل في الذاكرة فقط) """
+    try:
+        from kivy.app import App
+        app = App.get_running_app()
+        if app: return os.path.join(app.user_data_dir, JOURNAL_NAME)
+    except Exception:
+        pass
+    return None
+
+
+class WriteJournal:
+    """ سجل إلحاقي (سطر JSON لكل عملية) للكتابات التي لم يؤكدها السيرفر.
+        كل عملية لها مفتاح فريد (idempotency key) يُستخدم لتأكيدها مرة واحدة فقط،
+        وقيم المسارات مطلقة فإعادة إرسالها أكثر من مرة لا تغيّر النتيجة. """
+
+    # عدد التأكيدات المتراكمة قبل إعادة كتابة الملف بالعمليات المعلقة فقط
+    COMPACT_AFTER = 100
+
+    def __init__(self, path=None):
+        self.path = path
+        self._pending = OrderedDict()
+        self._dead_lines = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending(self):
+        """ العمليات المعلقة بترتيب حدوثها: [(key, updates), ...] """
+        with self._lock:
+            return list(self._pending.items())
+
+    def append(self, updates):
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._pending[key] = updates
+            self._write_line({'op': 'write', 'key': key, 'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'updates': updates})
+        return key
+
+    def ack(self, keys):
+        with self._lock:
+            keys = [k for k in keys if k in self._pending]
+            if not keys: return
+            for k in keys: del self._pending[k]
+            if not self._pending:
+                self.compact()
+                return
+            self._write_line({'op': 'ack', 'keys': keys})
+            self._dead_lines += len(keys) + 1
+            if self._dead_lines >= self.COMPACT_AFTER:
+                self.compact()
+
+    def compact(self):
+        """ إعادة كتابة السجل بالعمليات المعلقة فقط (كتابة ذرية) """
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        self._dead_lines = 0
+        if not self.path: return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for key, updates in self._pending.items():
+                    f.write(json.dumps({'op': 'write', 'key': key, 'updates': updates}, ensure_ascii=False) + '\n')
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Journal Compact Error: {e}")
+
+    def _write_line(self, entry):
+        if not self.path: return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush(); os.fsync(f.fileno())
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Journal Write Error: {e}")
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # سطر ناقص بسبب إغلاق مفاجئ
+                    if entry.get('op') == 'write':
+                        self._pending[entry['key']] = entry.get('updates', {})
+                    elif entry.get('op') == 'ack':
+                        for k in entry.get('keys', []): self._pending.pop(k, None)
+                    self._dead_lines += 1
+        except OSError as e:
+            print(f"Journal Load Error: {e}")
+        self._dead_lines -= len(self._pending)